@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Latency-based admission control middleware.
+This file is the source of truth of its deliberate copy
+0x03-user_authentication_service/admission.py: copy it there after every
+change.
+"""
+import json
+import time
+from threading import Lock
+
+
+def trusted_proxies(value: str) -> frozenset:
+    """
+    Returns the addresses of a comma-separated list, e.g. the value of
+    ADMISSION_TRUSTED_PROXIES
+    """
+    return frozenset(address.strip() for address in (value or '').split(',')
+                     if address.strip())
+
+
+def client_address(environ: dict, trusted: frozenset) -> str:
+    """
+    Returns the address of the client of a request: REMOTE_ADDR, or for
+    a request from a trusted proxy the last X-Forwarded-For address that
+    is not itself a trusted proxy
+    """
+    address = environ.get('REMOTE_ADDR')
+    if address not in trusted:
+        return address
+    forwarded = environ.get('HTTP_X_FORWARDED_FOR', '').split(',')
+    for hop in reversed([hop.strip() for hop in forwarded if hop.strip()]):
+        address = hop
+        if hop not in trusted:
+            break
+    return address
+
+
+def _queue_time(environ: dict, now: float, trusted: frozenset) -> float:
+    """
+    Returns the seconds a request waited before reaching the application,
+    from the X-Request-Start header set by a front proxy ("t=<time>" or
+    "<time>", in seconds, milliseconds or microseconds), 0.0 without it
+    or when the request does not come from a trusted proxy address, as
+    clients could otherwise get requests shed or admitted at will
+    """
+    value = environ.get('HTTP_X_REQUEST_START')
+    if not value or environ.get('REMOTE_ADDR') not in trusted:
+        return 0.0
+    try:
+        start = float(value.strip().lstrip('t='))
+    except ValueError:
+        return 0.0
+    if start > 1e14:
+        start /= 1e6
+    elif start > 1e11:
+        start /= 1e3
+    return max(now - start, 0.0)
+
+
+class RouteLimit:
+    """
+    Adaptive concurrency limit of one class of routes.
+    The limit follows AIMD: each request finished within target seconds
+    (queueing plus service time) while the limit is at least half used
+    raises it by 1/limit, about +1 per limit requests; each slower one
+    multiplies it by backoff.
+    """
+
+    def __init__(self, target: float, initial: int = 10, min_limit: int = 1,
+                 max_limit: int = 100, backoff: float = 0.9):
+        """
+        Initialize the limit
+        Args:
+            target (float): acceptable latency in seconds
+            initial (int): starting concurrency limit
+            min_limit (int): lowest concurrency limit
+            max_limit (int): highest concurrency limit
+            backoff (float): factor applied to the limit on slow requests
+        """
+        self.target = target
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.inflight = 0
+        self.admitted = 0
+        self.shed = 0
+        self.queue_time = 0.0
+        self.service_time = 0.0
+        self._lock = Lock()
+
+    def acquire(self) -> bool:
+        """
+        Takes a slot, False if the limit is reached
+        """
+        with self._lock:
+            if self.inflight >= int(self.limit):
+                self.shed += 1
+                return False
+            self.inflight += 1
+            self.admitted += 1
+            return True
+
+    def reject(self):
+        """
+        Counts a request shed without taking a slot
+        """
+        with self._lock:
+            self.shed += 1
+
+    def release(self, queue_time: float, service_time: float):
+        """
+        Gives a slot back and adapts the limit to the request latency
+        """
+        with self._lock:
+            self.inflight -= 1
+            self.queue_time += 0.1 * (queue_time - self.queue_time)
+            self.service_time += 0.1 * (service_time - self.service_time)
+            if queue_time + service_time > self.target:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+            elif 2 * (self.inflight + 1) >= self.limit:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def stats(self) -> dict:
+        """
+        Returns the limit, its usage and the average latencies (EWMA)
+        """
+        return {
+            "limit": int(self.limit),
+            "inflight": self.inflight,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "queue_time": self.queue_time,
+            "service_time": self.service_time
+        }
+
+
+class _Released:
+    """
+    Response iterable releasing the slot of its request once the body is
+    consumed or closed, whichever comes first, so that a streamed body
+    counts as in flight until sent (its latency is measured when the
+    application returns, see AdmissionControl)
+    """
+
+    def __init__(self, iterable, release):
+        """
+        Wrap the response iterable of the application
+        """
+        self._iterable = iterable
+        self._release = release
+
+    def _done(self):
+        """
+        Releases the slot, once
+        """
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+    def __iter__(self):
+        """
+        Iterates over the response body
+        """
+        for chunk in self._iterable:
+            yield chunk
+        self._done()
+
+    def close(self):
+        """
+        Closes the wrapped iterable, then releases the slot
+        """
+        try:
+            if hasattr(self._iterable, 'close'):
+                self._iterable.close()
+        finally:
+            self._done()
+
+    def __del__(self):
+        """
+        Releases the slot of a body dropped without being consumed or
+        closed (e.g. by a test client)
+        """
+        self._done()
+
+
+class AdmissionControl:
+    """
+    WSGI middleware keeping one RouteLimit per class of routes.
+    classify maps a path to a class name, None for the routes that are
+    always admitted (health checks). A request is shed with 503 and
+    Retry-After when its class is at its limit, or when it already
+    queued longer than the class target before reaching the application
+    (known from trusted proxies only). The limits only bind when the
+    server runs requests concurrently (threads, e.g. the api.v1.prefork
+    workers): serving one request at a time, only the queueing time can
+    shed.
+    The latency fed back to the limit ends when the application returns
+    its response: a streamed body (e.g. /users/export) or a slow client
+    keeps its slot until the body is sent, but not its latency.
+    """
+
+    def __init__(self, app, limits: dict, classify,
+                 trusted: frozenset = frozenset()):
+        """
+        Wrap a WSGI application
+        Args:
+            app: WSGI application
+            limits (dict): class name -> RouteLimit
+            classify: callable(path) -> class name or None
+            trusted (frozenset): addresses of the proxies whose
+            X-Request-Start header is honoured
+        """
+        self.app = app
+        self.limits = limits
+        self.classify = classify
+        self.trusted = trusted
+
+    def __call__(self, environ, start_response):
+        """
+        Admits, sheds or passes through a request
+        """
+        name = self.classify(environ.get('PATH_INFO', ''))
+        limit = self.limits.get(name)
+        if limit is None:
+            return self.app(environ, start_response)
+        start = time.perf_counter()
+        queue_time = _queue_time(environ, time.time(), self.trusted)
+        if queue_time > limit.target:
+            limit.reject()
+            return self._shed(start_response)
+        if not limit.acquire():
+            return self._shed(start_response)
+        try:
+            iterable = self.app(environ, start_response)
+        except BaseException:
+            limit.release(queue_time, time.perf_counter() - start)
+            raise
+        service_time = time.perf_counter() - start
+        return _Released(iterable,
+                         lambda: limit.release(queue_time, service_time))
+
+    @staticmethod
+    def _shed(start_response) -> list:
+        """
+        Answers 503 without calling the application
+        """
+        body = json.dumps({"error": "Service Unavailable"}).encode('utf-8')
+        start_response("503 SERVICE UNAVAILABLE", [
+            ("Content-Type", "application/json"),
+            ("Content-Length", str(len(body))),
+            ("Retry-After", "1")
+        ])
+        return [body]
+
+    def stats(self) -> dict:
+        """
+        Returns the stats of every route class
+        """
+        return {name: limit.stats() for name, limit in self.limits.items()}
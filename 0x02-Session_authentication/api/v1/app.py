@@ -3,79 +3,184 @@
 Route module for the API
 """
 from os import getenv
-from api.v1.views import app_views
-from flask import Flask, jsonify, abort, request
+from threading import Thread
+from api.v1.admission import AdmissionControl, RouteLimit, trusted_proxies
+from api.v1.views import app_views, data_ready, load_data
+from flask import Flask, jsonify, abort, request, current_app
 from flask_cors import (CORS, cross_origin)
+from api.v1.auth.auth import PathMatcher
+from api.v1.auth.context import AuthRequest
+from api.v1.json_provider import install as install_json_provider
+from api.v1.metrics import install as install_metrics, instrument
+from models.base import Base, refresh_all
 import os
 
 
-app = Flask(__name__)
-app.register_blueprint(app_views)
-CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
-auth = None
-AUTH_TYPE = os.getenv("AUTH_TYPE")
-if AUTH_TYPE == "auth":
-    from api.v1.auth.auth import Auth
-    auth = Auth()
-elif AUTH_TYPE == "basic_auth":
-    from api.v1.auth.basic_auth import BasicAuth
-    auth = BasicAuth()
-elif AUTH_TYPE == "session_auth":
-    from api.v1.auth.session_auth import SessionAuth
-    auth = SessionAuth()
-elif AUTH_TYPE == "session_exp_auth":
-    from api.v1.auth.session_exp_auth import SessionExpAuth
-    auth = SessionExpAuth()
-elif AUTH_TYPE == "session_db_auth":
-    from api.v1.auth.session_db_auth import SessionDBAuth
-    auth = SessionDBAuth()
-
-
-@app.before_request
+EXCLUDED_PATHS = PathMatcher([
+    '/api/v1/status/',
+    '/api/v1/metrics/',
+    '/api/v1/unauthorized/',
+    '/api/v1/forbidden/',
+    '/api/v1/auth_session/login/'
+])
+DATA_INDEPENDENT_PATHS = PathMatcher([
+    '/api/v1/status/',
+    '/api/v1/metrics/',
+    '/api/v1/unauthorized/',
+    '/api/v1/forbidden/'
+])
+AUTH_PATHS = PathMatcher(['/api/v1/auth_session/*'])
+USER_PATHS = PathMatcher(['/api/v1/users*'])
+
+
+def route_class(path: str) -> str:
+    """ Returns the admission control class of a path, None for the
+    status, metrics and error endpoints, which are always admitted
+    """
+    path = path or '/'
+    if DATA_INDEPENDENT_PATHS.excludes(path):
+        return None
+    if AUTH_PATHS.excludes(path):
+        return "auth"
+    if USER_PATHS.excludes(path):
+        return "users"
+    return "default"
+
+
+def create_auth():
+    """ Returns the auth instance selected by AUTH_TYPE, None if unset
+    """
+    AUTH_TYPE = os.getenv("AUTH_TYPE")
+    if AUTH_TYPE == "auth":
+        from api.v1.auth.auth import Auth
+        return Auth()
+    elif AUTH_TYPE == "basic_auth":
+        from api.v1.auth.basic_auth import BasicAuth
+        return BasicAuth()
+    elif AUTH_TYPE == "session_auth":
+        from api.v1.auth.session_auth import SessionAuth
+        return SessionAuth()
+    elif AUTH_TYPE == "session_exp_auth":
+        from api.v1.auth.session_exp_auth import SessionExpAuth
+        return SessionExpAuth()
+    elif AUTH_TYPE == "session_db_auth":
+        from api.v1.auth.session_db_auth import SessionDBAuth
+        return SessionDBAuth()
+    elif AUTH_TYPE == "signed_session_auth":
+        from api.v1.auth.signed_session_auth import SignedSessionAuth
+        return SignedSessionAuth()
+    return None
+
+
+def create_app(preload: bool = False) -> Flask:
+    """ Builds the API application and its auth instance, kept in
+    app.extensions['auth'] so that every app has its own.
+    With preload, the stored data is loaded before returning, as a
+    pre-fork master does so that its workers share it; otherwise it is
+    loaded by a background thread and requests get 503 until it is ready
+    """
+    app = Flask(__name__)
+    app.request_class = AuthRequest
+    install_json_provider(app)
+    app.register_blueprint(app_views)
+    CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
+    auth = create_auth()
+    app.extensions['auth'] = auth
+    trusted = trusted_proxies(os.getenv("ADMISSION_TRUSTED_PROXIES"))
+    app.extensions['trusted_proxies'] = trusted
+    if os.getenv("METRICS", "1") != "0":
+        install_metrics(app)
+        if hasattr(app, 'json'):  # jsonify, pluggable since Flask 2.2
+            instrument(app.json, ('response',), "serialization")
+        instrument(Base, ('search', 'save_to_file'), "storage")
+        if auth is not None:
+            instrument(auth, ('require_auth', 'current_user'), "auth")
+    app.before_request(bef_req)
+    app.register_error_handler(503, unavailable)
+    app.register_error_handler(404, not_found)
+    app.register_error_handler(401, unauthorized)
+    app.register_error_handler(403, forbidden)
+    if os.getenv("ADMISSION_CONTROL", "1") != "0":
+        try:
+            target = float(os.getenv("ADMISSION_TARGET", 0.5))
+        except ValueError:
+            target = 0.5
+        app.wsgi_app = AdmissionControl(app.wsgi_app, {
+            "auth": RouteLimit(2 * target),
+            "users": RouteLimit(target),
+            "default": RouteLimit(target)
+        }, route_class, trusted)
+        app.extensions['admission'] = app.wsgi_app
+    loaders = [auth.load_sessions] if hasattr(auth, 'load_sessions') else []
+    if preload:
+        load_data(*loaders)
+    else:
+        Thread(target=load_data, name="data-loader", daemon=True,
+               args=loaders).start()
+    return app
+
+
 def bef_req():
     """
-    Filter each request before it's handled by the proper route
+    Filter each request before it's handled by the proper route.
+    Routes that need the stored data answer 503 until it is loaded, then
+    reload the stored classes another worker wrote since (one stat each).
+    request.current_user is resolved lazily (see AuthRequest), so
+    excluded paths never look the user up and protected ones do it once.
     """
+    if not DATA_INDEPENDENT_PATHS.excludes(request.path):
+        if not data_ready.is_set():
+            abort(503, description="Service Unavailable")
+        refresh_all()
+    auth = current_app.extensions.get('auth')
     if auth is None:
         pass
     else:
-        setattr(request, "current_user", auth.current_user(request))
-        excluded = [
-            '/api/v1/status/',
-            '/api/v1/unauthorized/',
-            '/api/v1/forbidden/',
-            '/api/v1/auth_session/login/'
-        ]
-        if auth.require_auth(request.path, excluded):
+        if auth.require_auth(request.path, EXCLUDED_PATHS):
             cookie = auth.session_cookie(request)
             if auth.authorization_header(request) is None and cookie is None:
                 abort(401, description="Unauthorized")
-            if auth.current_user(request) is None:
+            if request.current_user is None:
                 abort(403, description="Forbidden")
 
 
-@app.errorhandler(404)
+def unavailable(error) -> str:
+    """ Data not loaded yet handler
+    """
+    return jsonify({"error": "Service Unavailable"}), 503, \
+        {"Retry-After": "1"}
+
+
 def not_found(error) -> str:
     """ Not found handler
     """
     return jsonify({"error": "Not found"}), 404
 
 
-@app.errorhandler(401)
 def unauthorized(error) -> str:
     """ Request unauthorized handler
     """
     return jsonify({"error": "Unauthorized"}), 401
 
 
-@app.errorhandler(403)
 def forbidden(error) -> str:
     """ Request unauthorized handler
     """
     return jsonify({"error": "Forbidden"}), 403
 
 
+def __getattr__(name: str):
+    """ Builds the default application on first access to
+    api.v1.app.app, so importing create_app alone builds nothing
+    """
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError("module {} has no attribute {}".format(
+        __name__, name))
+
+
 if __name__ == "__main__":
     host = getenv("API_HOST", "0.0.0.0")
     port = getenv("API_PORT", "5000")
-    app.run(host=host, port=port)
+    create_app().run(host=host, port=port)
@@ -2,41 +2,93 @@
 """
 Module of Authentication
 """
+import os
+from functools import lru_cache
 from flask import request
 from typing import List, TypeVar
 
+MATCH_CACHE_SIZE = 4096  # Paths whose result is memoized per PathMatcher
+_END = None  # Trie key marking the end of a wildcard prefix
+
+
+class PathMatcher:
+    """ Excluded paths compiled for Auth.require_auth
+
+    Entries without a trailing '*' go into a set and match a path once it
+    ends with '/'. Wildcard entries go into a character trie and match
+    any path starting with what precedes the '*'. Results are memoized
+    per path in a bounded LRU cache.
+    """
+
+    def __init__(self, excluded_paths: List[str],
+                 cache_size: int = MATCH_CACHE_SIZE):
+        """ Compile a list of excluded paths
+        """
+        self._size = len(excluded_paths)
+        self._exact = set()
+        self._trie = {}
+        for x in excluded_paths:
+            if len(x) == 0:
+                continue
+            if x[-1] != '*':
+                self._exact.add(x)
+                continue
+            node = self._trie
+            for char in x[:-1]:
+                node = node.setdefault(char, {})
+            node[_END] = True
+        self.excludes = lru_cache(maxsize=cache_size)(self._excludes)
+
+    def __len__(self) -> int:
+        """ Number of excluded paths compiled
+        """
+        return self._size
+
+    def _excludes(self, path: str) -> bool:
+        """ True if a non-empty path matches one of the excluded paths
+        """
+        tmpPath = path if path[-1] == '/' else path + '/'
+        if tmpPath in self._exact:
+            return True
+        node = self._trie
+        if _END in node:
+            return True
+        for char in path:
+            node = node.get(char)
+            if node is None:
+                return False
+            if _END in node:
+                return True
+        return False
+
+
+@lru_cache(maxsize=32)
+def _compile(excluded_paths: tuple) -> PathMatcher:
+    """ Compile a plain list of excluded paths, once per distinct list
+    """
+    return PathMatcher(excluded_paths)
+
 
 class Auth:
     """ Class to manage the API authentication """
 
     def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
-        """ For validating if endpoint requires auth """
-        if path is None or excluded_paths is None or excluded_paths == []:
-            return True
+        """ For validating if endpoint requires auth
 
-        lenPath = len(path)
-        if lenPath == 0:
+        excluded_paths is either a list of paths or a PathMatcher
+        compiled from one at startup.
+        """
+        if path is None or excluded_paths is None or \
+                len(excluded_paths) == 0:
             return True
 
-        slash = True if path[lenPath - 1] == '/' else False
-
-        tmpPath = path
-        if not slash:
-            tmpPath += '/'
-
-        for x in excluded_paths:
-            lenExc = len(x)
-            if lenExc == 0:
-                continue
+        if len(path) == 0:
+            return True
 
-            if x[lenExc - 1] != '*':
-                if tmpPath == x:
-                    return False
-            else:
-                if x[:-1] == path[:lenExc - 1]:
-                    return False
+        if not isinstance(excluded_paths, PathMatcher):
+            excluded_paths = _compile(tuple(excluded_paths))
 
-        return True
+        return not excluded_paths.excludes(path)
 
     def authorization_header(self, request=None) -> str:
         """ A method that handles authorization header """
@@ -48,3 +100,14 @@ class Auth:
     def current_user(self, request=None) -> TypeVar('User'):
         """ Validates current user """
         return None
+
+    def session_cookie(self, request=None) -> str:
+        """ Returns the value of the SESSION_NAME cookie of a request """
+        if request is None:
+            return None
+
+        return request.cookies.get(os.getenv('SESSION_NAME'))
+
+    def close(self):
+        """ Persists the state of the instance before the process exits;
+        nothing to persist here """
@@ -6,6 +6,12 @@ from api.v1.auth.auth import Auth
 from models.user import User
 from typing import TypeVar
 from base64 import b64decode
+from collections import OrderedDict
+from hashlib import sha256
+from threading import Lock
+import hmac
+import os
+import time
 
 
 class BasicAuth(Auth):
@@ -13,6 +19,28 @@ class BasicAuth(Auth):
     This is a basic Authentication Class
     """
 
+    def __init__(self):
+        """
+        Initialize the verified-credential cache.
+        Entries are keyed by an HMAC of the Authorization header under a
+        per-process secret and map to the user id, the email and the
+        password hash seen at verification time; a hit is only used
+        while the user still exists with the same email and password.
+        """
+        try:
+            self.cache_ttl = int(os.getenv('BASIC_AUTH_CACHE_TTL', 60))
+        except ValueError:
+            self.cache_ttl = 60
+        try:
+            self.cache_size = int(os.getenv('BASIC_AUTH_CACHE_SIZE', 10000))
+        except ValueError:
+            self.cache_size = 10000
+        self._cache_secret = os.urandom(32)
+        self._cache = OrderedDict()
+        self._cache_lock = Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
     def extract_base64_authorization_header(self,
                                             authorization_header: str) -> str:
         """
@@ -97,6 +125,61 @@ class BasicAuth(Auth):
 
         return None
 
+    def _cache_key(self, authorization_header: str) -> bytes:
+        """
+        This method returns the cache key of an Authorization header
+        """
+        return hmac.new(self._cache_secret,
+                        authorization_header.encode('utf-8'),
+                        sha256).digest()
+
+    def _cached_user(self, key: bytes) -> TypeVar('User'):
+        """
+        This method returns the User cached for a key, or None if the
+        entry is missing, expired or no longer matches the user
+        """
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                self.cache_misses += 1
+                return None
+            user_id, email, password, expires = entry
+            user = User.get(user_id)
+            if expires < time.monotonic() or user is None or \
+                    user.email != email or user.password != password:
+                del self._cache[key]
+                self.cache_misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return user
+
+    def _cache_user(self, key: bytes, user: TypeVar('User')):
+        """
+        This method caches a verified User, evicting the least recently
+        used entries beyond cache_size
+        """
+        if self.cache_ttl <= 0 or self.cache_size <= 0:
+            return
+        expires = time.monotonic() + self.cache_ttl
+        with self._cache_lock:
+            self._cache[key] = (user.id, user.email, user.password, expires)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def cache_stats(self) -> dict:
+        """
+        This method returns the hit rate metrics of the credential cache
+        """
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "size": len(self._cache),
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "hit_rate": self.cache_hits / lookups if lookups else 0.0
+        }
+
     def current_user(self, request=None) -> TypeVar('User'):
         """
         This method overloads Auth and retrieves the User
@@ -107,6 +190,11 @@ class BasicAuth(Auth):
         if not auth_head:
             return None
 
+        key = self._cache_key(auth_head)
+        user = self._cached_user(key)
+        if user is not None:
+            return user
+
         encoded = self.extract_base64_authorization_header(auth_head)
 
         if not encoded:
@@ -124,4 +212,7 @@ class BasicAuth(Auth):
 
         user = self.user_object_from_credentials(email, pwd)
 
+        if user is not None:
+            self._cache_user(key, user)
+
         return user
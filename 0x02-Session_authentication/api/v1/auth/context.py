@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Request-scoped authentication context
+"""
+from flask import Request, current_app
+from typing import TypeVar
+
+_UNRESOLVED = object()  # current_user has not been looked up yet
+
+
+class AuthRequest(Request):
+    """
+    Request class whose current_user is resolved lazily through the
+    Auth instance of the app (app.extensions['auth']), at most once per
+    request
+    """
+
+    @property
+    def current_user(self) -> TypeVar('User'):
+        """
+        Returns the User of the request, looking it up on first access
+        """
+        user = getattr(self, '_current_user', _UNRESOLVED)
+        if user is _UNRESOLVED:
+            user = None
+            auth = current_app.extensions.get('auth')
+            if auth is not None:
+                user = auth.current_user(self)
+            self._current_user = user
+        return user
+
+    @current_user.setter
+    def current_user(self, user: TypeVar('User')):
+        """
+        Overrides the User of the request
+        """
+        self._current_user = user
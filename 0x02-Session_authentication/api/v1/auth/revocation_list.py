@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Definition of class RevocationList
+"""
+import heapq
+import os
+import sqlite3
+import threading
+import time
+from threading import Lock
+from .session_store import _env_int
+
+
+def create_revocation_list():
+    """
+    Returns the revocation list matching SESSION_BACKEND: in-process for
+    "memory" (default), shared by the processes of a host for "sqlite".
+    Both provide add, get, full and len
+    """
+    if os.getenv('SESSION_BACKEND', 'memory') == 'sqlite':
+        return SQLiteRevocationList()
+    return RevocationList()
+
+
+class RevocationList:
+    """
+    Bounded in-process map of revoked keys to a value (e.g. the time the
+    tokens of a user were revoked). Each entry is kept until a wall-clock
+    deadline, after which the tokens it revokes are rejected anyway;
+    deadlines are indexed in a heap so expired entries are dropped in
+    O(expired * log n). An entry is never dropped before its deadline, as
+    the tokens it revokes would be accepted again: once max_size entries
+    are kept, full() tells the caller to stop issuing tokens instead.
+    """
+
+    def __init__(self, max_size: int = None):
+        """
+        Initialize an empty list
+        Args:
+            max_size (int): number of entries from which the list is
+            full, read from SESSION_REVOCATION_SIZE when not given (0
+            means never)
+        """
+        if max_size is None:
+            max_size = _env_int('SESSION_REVOCATION_SIZE', 100000)
+        self.max_size = max_size
+        self._entries = {}  # key -> (value, until)
+        self._heap = []  # (until, key), stale once the key is re-added
+        self._lock = Lock()
+
+    def _expire(self, now: float):
+        """
+        Drops the entries whose deadline has passed, lock held
+        """
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            until, key = heapq.heappop(heap)
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == until:
+                del self._entries[key]
+        if len(heap) > 2 * len(self._entries) + 64:
+            self._heap = [(until, key) for key, (_, until)
+                          in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    def add(self, key: str, value, until: float):
+        """
+        Revokes a key until a POSIX timestamp, even beyond max_size
+        """
+        with self._lock:
+            self._expire(time.time())
+            self._entries[key] = (value, until)
+            heapq.heappush(self._heap, (until, key))
+
+    def full(self) -> bool:
+        """
+        True if max_size unexpired entries are kept
+        """
+        with self._lock:
+            self._expire(time.time())
+            return 0 < self.max_size <= len(self._entries)
+
+    def get(self, key: str, default=None):
+        """
+        Returns the value of a key still revoked, else default
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            return default
+        return entry[0]
+
+    def __len__(self) -> int:
+        """
+        Number of entries kept
+        """
+        return len(self._entries)
+
+
+class SQLiteRevocationList:
+    """
+    Revocation list shared by every process of a host through one SQLite
+    file in WAL mode, so a logout in one worker is seen by the others.
+    Expired entries are deleted at most once every expire_every seconds
+    per process; like RevocationList, unexpired ones are never deleted
+    and full() reports when max_size of them are kept.
+    """
+
+    def __init__(self, path: str = None, max_size: int = None,
+                 expire_every: float = 1.0):
+        """
+        Initialize the list
+        Args:
+            path (str): SQLite file, "<SESSION_DB_PATH>_revoked.sqlite"
+            (".db_sessions_revoked.sqlite") by default
+            max_size (int): number of entries from which the list is
+            full, read from SESSION_REVOCATION_SIZE when not given (0
+            means never)
+            expire_every (float): minimum seconds between two expiry
+            passes of a process
+        """
+        if path is None:
+            path = "{}_revoked.sqlite".format(
+                os.getenv('SESSION_DB_PATH', '.db_sessions'))
+        if max_size is None:
+            max_size = _env_int('SESSION_REVOCATION_SIZE', 100000)
+        self.path = path
+        self.max_size = max_size
+        self.expire_every = expire_every
+        self._next_expire = 0.0
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Returns the connection of the current thread, reopening the one
+        inherited through fork
+        """
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.pid = os.getpid()
+            local.connection = None
+        if local.connection is None:
+            connection = sqlite3.connect(self.path, timeout=30,
+                                         isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS revocations ("
+                "key TEXT PRIMARY KEY, value INTEGER, until REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS revocations_until "
+                               "ON revocations (until)")
+            local.connection = connection
+        return local.connection
+
+    def expire(self, now: float = None) -> int:
+        """
+        Deletes the expired entries
+        Return:
+            number of entries deleted
+        """
+        if now is None:
+            now = time.time()
+        return self._connection().execute(
+            "DELETE FROM revocations WHERE until <= ?", (now,)).rowcount
+
+    def add(self, key: str, value, until: float):
+        """
+        Revokes a key until a POSIX timestamp
+        """
+        now = time.time()
+        if now >= self._next_expire:
+            self._next_expire = now + self.expire_every
+            self.expire(now)
+        self._connection().execute(
+            "INSERT OR REPLACE INTO revocations (key, value, until) "
+            "VALUES (?, ?, ?)", (key, value, until))
+
+    def get(self, key: str, default=None):
+        """
+        Returns the value of a key still revoked, else default
+        """
+        row = self._connection().execute(
+            "SELECT value FROM revocations WHERE key = ? AND until > ?",
+            (key, time.time())).fetchone()
+        return default if row is None else row[0]
+
+    def full(self) -> bool:
+        """
+        True if max_size unexpired entries are kept
+        """
+        if self.max_size <= 0:
+            return False
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM revocations WHERE until > ?",
+            (time.time(),)).fetchone()[0] >= self.max_size
+
+    def __len__(self) -> int:
+        """
+        Number of entries kept
+        """
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM revocations").fetchone()[0]
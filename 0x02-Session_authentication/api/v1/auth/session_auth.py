@@ -2,18 +2,147 @@
 """
 Definition of class SessionAuth
 """
+import atexit
 import base64
-from uuid import uuid4
+import logging
+import os
+from threading import Event, Thread
 from typing import TypeVar
+from weakref import WeakSet
 from .auth import Auth
+from .session_store import create_session_store
+from models.base import HOOKS
 from models.user import User
 
+_INSTANCES = WeakSet()  # Live instances, notified of User removals
+
 
 class SessionAuth(Auth):
     """
     A class that implement Session Authorization protocol methods
     """
-    user_id_by_session_id = {}
+    user_id_by_session_id = create_session_store()
+
+    def __init__(self):
+        """
+        Initialize the class
+        """
+        self.snapshot_path = os.getenv('SESSION_SNAPSHOT_PATH')
+        try:
+            interval = int(os.getenv('SESSION_SNAPSHOT_INTERVAL', 300))
+        except ValueError:
+            interval = 300
+        self.snapshot_interval = interval
+        self._snapshot_stop = Event()
+        self._snapshots = False  # True once load_sessions restored them
+        self._snapshot_pid = None  # Process writing the snapshots
+        _INSTANCES.add(self)
+
+    def load_sessions(self):
+        """
+        Loads the stored sessions.
+        When SESSION_SNAPSHOT_PATH is set, the sessions are restored from
+        that file, then written back to it at exit and every
+        SESSION_SNAPSHOT_INTERVAL seconds (300 by default, 0 to disable).
+        An unreadable snapshot is logged and the store starts empty.
+        Only the last forked process writes the snapshots: a pre-fork
+        master hands them over to its worker, which restores the file
+        again so that a respawned worker resumes from the last snapshot
+        """
+        store = self.user_id_by_session_id
+        if not self.snapshot_path or not hasattr(store, 'snapshot'):
+            return
+        self._snapshots = True
+        self._restore()
+        self._start_snapshots()
+        atexit.register(self._save_at_exit)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_parent=self._stop_snapshots,
+                                after_in_child=self._restart_in_child)
+
+    def _restore(self):
+        """
+        Replaces the stored sessions with those of the snapshot
+        """
+        store = self.user_id_by_session_id
+        try:
+            store.clear()
+            store.restore(self.snapshot_path)
+        except (OSError, ValueError, TypeError) as e:
+            store.clear()
+            logging.getLogger(__name__).error(
+                "Cannot restore sessions from %s: %s", self.snapshot_path, e)
+
+    def _start_snapshots(self):
+        """
+        Makes the current process the writer of the snapshots
+        """
+        self._snapshot_pid = os.getpid()
+        self._snapshot_stop = Event()
+        if self.snapshot_interval > 0:
+            Thread(target=self._snapshot_loop, name="session-snapshot",
+                   args=(self._snapshot_stop,), daemon=True).start()
+
+    def _stop_snapshots(self):
+        """
+        Stops writing snapshots from this process, whose forked child
+        now serves (and writes) the sessions
+        """
+        self._snapshot_pid = None
+        self._snapshot_stop.set()
+
+    def _restart_in_child(self):
+        """
+        Takes over the snapshots in a forked process, which inherits
+        neither the running thread nor the sessions of a previous worker
+        """
+        if self._snapshots:
+            self._restore()
+            self._start_snapshots()
+
+    def _save_at_exit(self):
+        """
+        Writes a last snapshot if this process writes them
+        """
+        if self._snapshot_pid == os.getpid():
+            self.save_sessions()
+
+    def close(self):
+        """
+        Stops the snapshots and writes the last one, e.g. when a worker
+        is terminated
+        """
+        self._save_at_exit()
+        self._stop_snapshots()
+
+    def destroy_user_sessions(self, user_id: str = None) -> int:
+        """
+        Destroys every session of a user
+        Args:
+            user_id (str): user's user id
+        Return:
+            number of sessions destroyed
+        """
+        if user_id is None or not isinstance(user_id, str):
+            return 0
+        return self.user_id_by_session_id.pop_user(user_id)
+
+    def _snapshot_loop(self, stop: Event):
+        """
+        Writes a snapshot every snapshot_interval seconds until stop is set
+        """
+        while not stop.wait(self.snapshot_interval):
+            self.save_sessions()
+
+    def save_sessions(self) -> int:
+        """
+        Writes the in-memory sessions to snapshot_path
+        Return:
+            number of sessions written
+        """
+        if not self.snapshot_path:
+            return 0
+        return self.user_id_by_session_id.snapshot(self.snapshot_path)
 
     def create_session(self, user_id: str = None) -> str:
         """
@@ -26,9 +155,9 @@ class SessionAuth(Auth):
         """
         if user_id is None or not isinstance(user_id, str):
             return None
-        id = uuid4()
-        self.user_id_by_session_id[str(id)] = user_id
-        return str(id)
+        id = self.user_id_by_session_id.new_session_id()
+        self.user_id_by_session_id[id] = user_id
+        return id
 
     def user_id_for_session_id(self, session_id: str = None) -> str:
         """
@@ -69,3 +198,17 @@ class SessionAuth(Auth):
             return False
         del self.user_id_by_session_id[session_cookie]
         return True
+
+
+def _cascade_user_removal(event, obj):
+    """
+    Destroys the sessions of a removed User through every live instance.
+    Registered once, so creating instances (an app per test, a new app
+    in a worker) neither adds hooks nor keeps old instances alive
+    """
+    if event == "remove" and isinstance(obj, User):
+        for auth in list(_INSTANCES):
+            auth.destroy_user_sessions(obj.id)
+
+
+HOOKS.append(_cascade_user_removal)
@@ -2,16 +2,56 @@
 """
 Define class SessionDButh
 """
+import atexit
+import os
+import time
+from datetime import (
+    datetime,
+    timedelta
+)
+from weakref import WeakSet
 from .session_exp_auth import SessionExpAuth
+from .session_sweeper import SessionSweeper
+from .session_store import _env_int
+from models.base import HOOKS
 from models.user_session import UserSession
 
+_INSTANCES = WeakSet()  # Live instances, whose refreshes are flushed at exit
+
 
 class SessionDBAuth(SessionExpAuth):
     """
     Definition of SessionDBAuth class that persists session data
-    in a database
+    in a database.
+    The in-memory session store inherited from SessionExpAuth serves as
+    a read cache in front of the UserSession records.
     """
 
+    def __init__(self):
+        """
+        Initialize the class and start the sweeper of expired sessions
+        every SESSION_SWEEP_INTERVAL seconds (60 by default, 0 to disable)
+        """
+        super().__init__()
+        self.pending_refreshes = 0
+        self._refreshed = {}  # Session ID -> last_seen not written yet
+        self.refresh_batch = _env_int('SESSION_REFRESH_BATCH', 100)
+        self._pending_since = 0.0
+        _INSTANCES.add(self)
+        try:
+            interval = int(os.getenv('SESSION_SWEEP_INTERVAL', 60))
+        except ValueError:
+            interval = 0
+        self.sweeper = SessionSweeper(self, interval)
+        self.sweeper.start()
+
+    def load_sessions(self):
+        """
+        Loads the stored sessions and the UserSession records
+        """
+        super().load_sessions()
+        UserSession.load_from_file()
+
     def create_session(self, user_id=None):
         """
         Create a Session ID for a user_id
@@ -35,12 +75,103 @@ class SessionDBAuth(SessionExpAuth):
         Args:
             session_id (str): session ID
         Return:
-            user id or None if session_id is None or not a string
+            user id or None if session_id is None or not a string,
+            unknown or expired
         """
-        user_id = UserSession.search({"session_id": session_id})
-        if user_id:
+        if session_id is None or not isinstance(session_id, str):
+            return None
+        user_id = super().user_id_for_session_id(session_id)
+        if user_id is not None:
             return user_id
-        return None
+        user_session = UserSession.get_by_session_id(session_id)
+        if user_session is None:
+            return None
+        utc_now, now = datetime.utcnow(), datetime.now()
+        age = utc_now - user_session.created_at
+        idle = age
+        if self.sliding:
+            idle = utc_now - user_session.seen_at
+        ttl = 0
+        if self.session_duration > 0:
+            remaining = timedelta(seconds=self.session_duration) - idle
+            if remaining.total_seconds() <= 0:
+                return None
+            ttl = remaining.total_seconds()
+        session_dictionary = {
+            "user_id": user_session.user_id,
+            "created_at": now - age
+        }
+        if self.sliding:
+            session_dictionary["last_seen"] = now - idle
+        self.user_id_by_session_id.set(session_id, session_dictionary,
+                                       ttl=ttl)
+        return user_session.user_id
+
+    def refresh_session(self, session_id, user_details, now):
+        """
+        Slides the expiration of a session and marks its UserSession
+        record for the next batched write, made once refresh_batch
+        refreshes (SESSION_REFRESH_BATCH, 100 by default) are pending or
+        the oldest has waited refresh_interval seconds, by the sweeper,
+        or at exit, whichever comes first
+        """
+        super().refresh_session(session_id, user_details, now)
+        user_session = UserSession.get_by_session_id(session_id)
+        if user_session is not None:
+            user_session.last_seen = datetime.utcnow()
+            self._refreshed[session_id] = user_session.last_seen
+            if self.pending_refreshes == 0:
+                self._pending_since = time.monotonic()
+            self.pending_refreshes += 1
+            if self.pending_refreshes >= self.refresh_batch or \
+                    time.monotonic() - self._pending_since >= \
+                    self.refresh_interval:
+                self.flush_refreshes()
+
+    def flush_refreshes(self) -> int:
+        """
+        Persists the pending refreshes with a single write. If another
+        process wrote the session file meanwhile, it is reloaded first
+        and the refreshes are applied again to the reloaded records
+        Return:
+            number of refreshes persisted
+        """
+        pending = self.pending_refreshes
+        if pending > 0:
+            self.pending_refreshes = 0
+            refreshed, self._refreshed = self._refreshed, {}
+            with UserSession.locked():
+                if UserSession.refresh():
+                    for session_id, last_seen in refreshed.items():
+                        user_session = UserSession.get_by_session_id(
+                            session_id)
+                        if user_session is not None and \
+                                user_session.seen_at < last_seen:
+                            user_session.last_seen = last_seen
+                UserSession.save_to_file()
+        return pending
+
+    def close(self):
+        """
+        Stops the sweeper and persists the pending refreshes
+        """
+        self.sweeper.stop()
+        self.flush_refreshes()
+        super().close()
+
+    def destroy_user_sessions(self, user_id=None):
+        """
+        Destroys every session of a user, cached and stored, writing the
+        session file once
+        Args:
+            user_id (str): user's user id
+        Return:
+            number of sessions destroyed
+        """
+        if user_id is None or not isinstance(user_id, str):
+            return 0
+        super().destroy_user_sessions(user_id)
+        return UserSession.remove_many(UserSession.get_by_user_id(user_id))
 
     def destroy_session(self, request=None):
         """
@@ -52,8 +183,30 @@ class SessionDBAuth(SessionExpAuth):
         session_id = self.session_cookie(request)
         if not session_id:
             return False
-        user_session = UserSession.search({"session_id": session_id})
-        if user_session:
-            user_session[0].remove()
-            return True
-        return False
+        self.user_id_by_session_id.pop(session_id, None)
+        user_session = UserSession.get_by_session_id(session_id)
+        if user_session is None:
+            return False
+        user_session.remove()
+        return True
+
+
+def _forget_removed(event, obj):
+    """
+    Drops cached sessions whose UserSession record is removed. The cache
+    is shared by every instance, so the hook is registered once
+    """
+    if event == "remove" and isinstance(obj, UserSession):
+        SessionDBAuth.user_id_by_session_id.pop(obj.session_id, None)
+
+
+def _flush_at_exit():
+    """
+    Persists the pending refreshes of every live instance
+    """
+    for auth in list(_INSTANCES):
+        auth.flush_refreshes()
+
+
+HOOKS.append(_forget_removed)
+atexit.register(_flush_at_exit)
@@ -14,17 +14,33 @@ from .session_auth import SessionAuth
 class SessionExpAuth(SessionAuth):
     """
     Definition of class SessionExpAuth that adds an
-    expiration date to a Session ID
+    expiration date to a Session ID.
+    With SESSION_SLIDING set, a session expires session_duration seconds
+    after it was last seen rather than after its creation; the last seen
+    time is refreshed at most once every SESSION_REFRESH_INTERVAL seconds
+    (capped to half of session_duration) so that active sessions do not
+    cost a store write per request.
     """
     def __init__(self):
         """
         Initialize the class
         """
+        super().__init__()
         try:
             duration = int(os.getenv('SESSION_DURATION'))
         except Exception:
             duration = 0
         self.session_duration = duration
+        self.sliding = os.getenv('SESSION_SLIDING', '').lower() in \
+            ('1', 'true', 'yes')
+        try:
+            refresh_interval = int(os.getenv('SESSION_REFRESH_INTERVAL', 60))
+        except ValueError:
+            refresh_interval = 60
+        if duration > 0:
+            # Refresh well within the window, or sessions expire in use
+            refresh_interval = min(refresh_interval, duration // 2)
+        self.refresh_interval = refresh_interval
 
     def create_session(self, user_id=None):
         """
@@ -39,7 +55,8 @@ class SessionExpAuth(SessionAuth):
             "user_id": user_id,
             "created_at": datetime.now()
         }
-        self.user_id_by_session_id[session_id] = session_dictionary
+        self.user_id_by_session_id.set(session_id, session_dictionary,
+                                       ttl=self.session_duration)
         return session_id
 
     def user_id_for_session_id(self, session_id=None):
@@ -59,8 +76,26 @@ class SessionExpAuth(SessionAuth):
             return None
         if self.session_duration <= 0:
             return user_details.get("user_id")
-        created_at = user_details.get("created_at")
-        allowed_window = created_at + timedelta(seconds=self.session_duration)
-        if allowed_window < datetime.now():
+        seen_at = user_details.get("created_at")
+        if self.sliding:
+            seen_at = user_details.get("last_seen", seen_at)
+        now = datetime.now()
+        allowed_window = seen_at + timedelta(seconds=self.session_duration)
+        if allowed_window < now:
             return None
+        if self.sliding and \
+                (now - seen_at).total_seconds() >= self.refresh_interval:
+            self.refresh_session(session_id, user_details, now)
         return user_details.get("user_id")
+
+    def refresh_session(self, session_id, user_details, now):
+        """
+        Slides the expiration of a session to session_duration from now
+        Args:
+            session_id (str): session ID
+            user_details (dict): session dictionary
+            now (datetime): time the session was seen
+        """
+        user_details["last_seen"] = now
+        self.user_id_by_session_id.set(session_id, user_details,
+                                       ttl=self.session_duration)
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Definition of class SessionStore
+"""
+import heapq
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from threading import RLock
+from uuid import uuid4
+
+
+def _env_int(name: str, default: int) -> int:
+    """
+    Returns an integer environment variable, or default if unset/invalid
+    """
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _timestamp(value: datetime) -> float:
+    """
+    Returns the POSIX timestamp of a naive local datetime, None for None
+    """
+    return None if value is None else value.timestamp()
+
+
+def _user_of(value) -> str:
+    """
+    Returns the user ID of session data (a user ID or a session dict)
+    """
+    if isinstance(value, dict):
+        return value.get("user_id")
+    return value
+
+
+def create_session_store():
+    """
+    Returns the session store selected by SESSION_BACKEND:
+    "memory" (default, per process) or "sqlite" (shared by the processes
+    of a host). Every store provides new_session_id, set, get, pop,
+    clear, expire, session_ids_of, pop_user and the dict item
+    operations.
+    """
+    if os.getenv('SESSION_BACKEND', 'memory') == 'sqlite':
+        from .sqlite_session_store import SQLiteSessionStore
+        return SQLiteSessionStore()
+    return SessionStore()
+
+
+class SessionStore:
+    """
+    Bounded in-memory mapping of session ID to session data.
+    Sessions are kept in least recently used order and the oldest are
+    evicted beyond max_size. Sessions given a ttl are also indexed in a
+    heap of deadlines on the monotonic clock; every access first pops the
+    deadlines already passed, so expired sessions are reclaimed in
+    O(expired * log n) without scanning the store. Session IDs are also
+    indexed by user ID, so the sessions of one user are found without
+    scanning either.
+    """
+
+    def __init__(self, max_size: int = None):
+        """
+        Initialize an empty store
+        Args:
+            max_size (int): maximum number of sessions kept, read from
+            SESSION_STORE_SIZE when not given (0 means unbounded)
+        """
+        if max_size is None:
+            max_size = _env_int('SESSION_STORE_SIZE', 100000)
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._deadlines = {}
+        self._heap = []
+        self._by_user = {}
+        self._lock = RLock()
+
+    def _index(self, session_id: str, value):
+        """
+        Adds a session to the user index
+        """
+        user_id = _user_of(value)
+        if user_id is not None:
+            self._by_user.setdefault(user_id, set()).add(session_id)
+
+    def _unindex(self, session_id: str, value):
+        """
+        Removes a session from the user index
+        """
+        user_id = _user_of(value)
+        session_ids = self._by_user.get(user_id)
+        if session_ids is not None:
+            session_ids.discard(session_id)
+            if not session_ids:
+                del self._by_user[user_id]
+
+    def _evict(self):
+        """
+        Drops the least recently used sessions beyond max_size
+        """
+        while self.max_size > 0 and len(self._data) > self.max_size:
+            evicted, value = self._data.popitem(last=False)
+            self._deadlines.pop(evicted, None)
+            self._unindex(evicted, value)
+
+    def new_session_id(self) -> str:
+        """
+        Returns a new session ID
+        """
+        return str(uuid4())
+
+    def expire(self, now: float = None) -> int:
+        """
+        Removes the sessions whose deadline has passed
+        Return:
+            number of sessions removed
+        """
+        if now is None:
+            now = time.monotonic()
+        removed = 0
+        with self._lock:
+            heap = self._heap
+            while heap and heap[0][0] <= now:
+                deadline, session_id = heapq.heappop(heap)
+                if self._deadlines.get(session_id) == deadline:
+                    del self._deadlines[session_id]
+                    self._unindex(session_id, self._data.pop(session_id))
+                    removed += 1
+        return removed
+
+    def _compact(self):
+        """
+        Drops heap entries left behind by deleted or re-armed sessions
+        """
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [(deadline, session_id) for session_id, deadline
+                          in self._deadlines.items()]
+            heapq.heapify(self._heap)
+
+    def set(self, session_id: str, value, ttl: int = None):
+        """
+        Stores the data of a session
+        Args:
+            session_id (str): session ID
+            value: session data
+            ttl (int): seconds before the session expires, None to keep
+            the current deadline, 0 or less for no deadline
+        """
+        with self._lock:
+            self.expire()
+            if session_id in self._data:
+                self._unindex(session_id, self._data[session_id])
+            self._data[session_id] = value
+            self._data.move_to_end(session_id)
+            self._index(session_id, value)
+            if ttl is not None:
+                self._deadlines.pop(session_id, None)
+                if ttl > 0:
+                    deadline = time.monotonic() + ttl
+                    self._deadlines[session_id] = deadline
+                    heapq.heappush(self._heap, (deadline, session_id))
+                self._compact()
+            self._evict()
+
+    def get(self, session_id: str, default=None):
+        """
+        Returns the data of a live session and marks it recently used
+        """
+        with self._lock:
+            self.expire()
+            if session_id not in self._data:
+                return default
+            self._data.move_to_end(session_id)
+            return self._data[session_id]
+
+    def pop(self, session_id: str, default=None):
+        """
+        Removes a session and returns its data
+        """
+        with self._lock:
+            if session_id not in self._data:
+                return default
+            self._deadlines.pop(session_id, None)
+            value = self._data.pop(session_id)
+            self._unindex(session_id, value)
+            return value
+
+    def session_ids_of(self, user_id: str) -> list:
+        """
+        Returns the session IDs of a user
+        """
+        with self._lock:
+            self.expire()
+            return list(self._by_user.get(user_id, ()))
+
+    def pop_user(self, user_id: str) -> int:
+        """
+        Removes every session of a user in O(sessions of that user)
+        Return:
+            number of sessions removed
+        """
+        with self._lock:
+            session_ids = self._by_user.pop(user_id, set())
+            for session_id in session_ids:
+                self._deadlines.pop(session_id, None)
+                self._data.pop(session_id, None)
+            return len(session_ids)
+
+    def clear(self):
+        """
+        Removes every session
+        """
+        with self._lock:
+            self._data.clear()
+            self._deadlines.clear()
+            self._heap = []
+            self._by_user.clear()
+
+    def snapshot(self, path: str) -> int:
+        """
+        Writes the live sessions to path, replacing it atomically (the
+        rows are written and synced to a temporary file first).
+        Each session is one compact row
+        [session_id, user_id, created_at, last_seen, expires], times being
+        POSIX timestamps and expires the wall-clock deadline or null.
+        Return:
+            number of sessions written
+        """
+        now, wall = time.monotonic(), time.time()
+        rows = []
+        with self._lock:
+            self.expire(now)
+            for session_id, value in self._data.items():
+                deadline = self._deadlines.get(session_id)
+                expires = None if deadline is None else wall + deadline - now
+                if isinstance(value, dict):
+                    rows.append([session_id, value.get("user_id"),
+                                 _timestamp(value.get("created_at")),
+                                 _timestamp(value.get("last_seen")),
+                                 expires])
+                else:
+                    rows.append([session_id, value, None, None, expires])
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(json.dumps(rows, separators=(',', ':')))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return len(rows)
+
+    def restore(self, path: str) -> int:
+        """
+        Loads the sessions written by snapshot, dropping the expired ones
+        Return:
+            number of sessions restored
+        """
+        if not os.path.exists(path):
+            return 0
+        with open(path, 'r') as f:
+            rows = json.load(f)
+        now, wall = time.monotonic(), time.time()
+        restored = 0
+        with self._lock:
+            for session_id, user_id, created_at, last_seen, expires in rows:
+                if expires is not None and expires <= wall:
+                    continue
+                if created_at is None:
+                    value = user_id
+                else:
+                    value = {
+                        "user_id": user_id,
+                        "created_at": datetime.fromtimestamp(created_at)
+                    }
+                    if last_seen is not None:
+                        value["last_seen"] = datetime.fromtimestamp(last_seen)
+                if session_id in self._data:
+                    self._unindex(session_id, self._data[session_id])
+                self._data[session_id] = value
+                self._index(session_id, value)
+                if expires is not None:
+                    deadline = now + expires - wall
+                    self._deadlines[session_id] = deadline
+                    self._heap.append((deadline, session_id))
+                restored += 1
+            heapq.heapify(self._heap)
+            self._compact()
+            self._evict()
+        return restored
+
+    def __setitem__(self, session_id: str, value):
+        """
+        Stores the data of a session, keeping its current deadline
+        """
+        self.set(session_id, value)
+
+    def __getitem__(self, session_id: str):
+        """
+        Returns the data of a live session, KeyError if there is none
+        """
+        with self._lock:
+            self.expire()
+            self._data.move_to_end(session_id)
+            return self._data[session_id]
+
+    def __delitem__(self, session_id: str):
+        """
+        Removes a session, KeyError if there is none
+        """
+        with self._lock:
+            value = self._data.pop(session_id)
+            self._deadlines.pop(session_id, None)
+            self._unindex(session_id, value)
+
+    def __contains__(self, session_id: str) -> bool:
+        """
+        True if the session is live
+        """
+        with self._lock:
+            self.expire()
+            return session_id in self._data
+
+    def __len__(self) -> int:
+        """
+        Number of sessions stored
+        """
+        return len(self._data)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Definition of class SessionSweeper
+"""
+import os
+import time
+from datetime import (
+    datetime,
+    timedelta
+)
+from threading import Event, Thread
+from models.user_session import UserSession
+
+
+class SessionSweeper:
+    """
+    Removes expired UserSession records in batches.
+    Expired records are taken from the time-ordered index of UserSession
+    and removed with a single write of the session file per sweep.
+    Each sweep first persists the pending sliding-expiration refreshes
+    of the auth instance.
+    """
+
+    def __init__(self, auth, interval: int = 0):
+        """
+        Initialize the sweeper
+        Args:
+            auth: SessionDBAuth instance providing session_duration
+            interval (int): seconds between two sweeps of the background
+            thread, 0 or less to only sweep on demand
+        """
+        self.auth = auth
+        self.interval = interval
+        self.sessions_swept = 0
+        self.sweeps = 0
+        self.last_sweep_duration = 0.0
+        self.total_sweep_duration = 0.0
+        self._stop = Event()
+        self._thread = None
+        self._fork_hooked = False
+
+    def sweep(self) -> int:
+        """
+        Removes every UserSession not seen for session_duration
+        Return:
+            number of sessions removed
+        """
+        start = time.perf_counter()
+        removed = 0
+        self.auth.flush_refreshes()
+        if self.auth.session_duration > 0:
+            limit = datetime.utcnow() - \
+                timedelta(seconds=self.auth.session_duration)
+            expired = UserSession.pop_seen_before(limit)
+            if expired:
+                removed = UserSession.remove_many(expired)
+        duration = time.perf_counter() - start
+        self.sessions_swept += removed
+        self.sweeps += 1
+        self.last_sweep_duration = duration
+        self.total_sweep_duration += duration
+        return removed
+
+    def _run(self):
+        """
+        Sweeps every interval seconds until stopped
+        """
+        while not self._stop.wait(self.interval):
+            self.sweep()
+
+    def start(self):
+        """
+        Starts the background thread if an interval is configured
+        """
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name="session-sweeper",
+                              daemon=True)
+        self._thread.start()
+        if not self._fork_hooked and hasattr(os, 'register_at_fork'):
+            self._fork_hooked = True
+            os.register_at_fork(after_in_child=self._restart_in_child)
+
+    def _restart_in_child(self):
+        """
+        Restarts the background thread in a forked worker, which
+        inherits the thread object but not the running thread
+        """
+        if self._thread is not None:
+            self._thread = None
+            self.start()
+
+    def stop(self):
+        """
+        Stops the background thread
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> dict:
+        """
+        Returns the sweeper counters
+        """
+        return {
+            "sessions_swept": self.sessions_swept,
+            "sweeps": self.sweeps,
+            "last_sweep_duration": self.last_sweep_duration,
+            "total_sweep_duration": self.total_sweep_duration
+        }
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Define class SignedSessionAuth
+"""
+import hashlib
+import hmac
+import logging
+import os
+import time
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from .revocation_list import create_revocation_list
+from .session_exp_auth import SessionExpAuth
+from .session_store import _env_int
+
+
+def _b64encode(data: bytes) -> str:
+    """
+    Unpadded URL-safe base64
+    """
+    return urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data: str) -> bytes:
+    """
+    Decodes unpadded URL-safe base64
+    """
+    return urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+class SignedSessionAuth(SessionExpAuth):
+    """
+    Definition of class SignedSessionAuth whose Session IDs are
+    self-contained tokens
+    "<user id>.<issued>.<expiry>.<nonce>.<signature>", signed with
+    HMAC-SHA256 under SESSION_SECRET; the random nonce keeps the tokens
+    of two logins apart, so that each is revoked alone. Checking a token
+    costs no store lookup, so hosts share nothing but the secret; logout
+    adds the token to a small revocation list kept until the token
+    expires, and destroying the sessions of a user rejects every token
+    issued to that user until then. Revocations are only dropped once
+    expired, so when SESSION_REVOCATION_SIZE of them are kept no token is
+    issued (logins fail closed) until some expire. The revocation list is
+    per process by default and shared by the workers of a host with
+    SESSION_BACKEND=sqlite. Tokens issued without an expiry
+    (SESSION_DURATION=0) are accepted for SESSION_REVOCATION_TTL seconds
+    (30 days by default), so that their revocations expire too.
+    """
+
+    def __init__(self):
+        """
+        Initialize the class
+        """
+        super().__init__()
+        secret = os.getenv('SESSION_SECRET')
+        if secret:
+            self._secret = secret.encode('utf-8')
+        else:
+            self._secret = os.urandom(32)
+        self.revocation_ttl = _env_int('SESSION_REVOCATION_TTL', 2592000)
+        self._revoked = create_revocation_list()
+
+    def _sign(self, payload: str) -> str:
+        """
+        Returns the signature of a token payload
+        """
+        return _b64encode(hmac.new(self._secret, payload.encode('utf-8'),
+                                   hashlib.sha256).digest())
+
+    def create_session(self, user_id=None):
+        """
+        Create a signed Session ID for a user_id
+        Args:
+            user_id (str): user id
+        Return:
+            None if user_id is None or not a string, or if the revocation
+            list is full, else the token
+        """
+        if user_id is None or not isinstance(user_id, str):
+            return None
+        if self._revoked.full():
+            logging.getLogger(__name__).warning(
+                "Revocation list full: no session created for %s", user_id)
+            return None
+        now = time.time()
+        expires = 0
+        if self.session_duration > 0:
+            expires = int(now) + self.session_duration
+        payload = "{}.{:x}.{:x}.{}".format(
+            _b64encode(user_id.encode('utf-8')), int(now * 1000), expires,
+            _b64encode(os.urandom(9)))
+        return "{}.{}".format(payload, self._sign(payload))
+
+    def _lifetime(self) -> int:
+        """
+        Returns the seconds a token is accepted after it is issued
+        """
+        if self.session_duration > 0:
+            return self.session_duration
+        return self.revocation_ttl
+
+    def _verify(self, session_id):
+        """
+        Returns (user id, time until which it is accepted) of a valid
+        token that was not revoked, else (None, None)
+        """
+        if session_id is None or not isinstance(session_id, str):
+            return None, None
+        parts = session_id.split('.')
+        if len(parts) != 5:
+            return None, None
+        payload = ".".join(parts[:4])
+        if not hmac.compare_digest(self._sign(payload).encode('utf-8'),
+                                   parts[4].encode('utf-8')):
+            return None, None
+        try:
+            user_id = _b64decode(parts[0]).decode('utf-8')
+            issued = int(parts[1], 16)
+            expires = int(parts[2], 16)
+        except ValueError:
+            return None, None
+        until = expires if expires else issued / 1000 + self.revocation_ttl
+        if until <= time.time():
+            return None, None
+        if self._revoked.get(parts[4]) is not None or \
+                issued <= self._revoked.get("user:" + user_id, -1):
+            return None, None
+        return user_id, until
+
+    def user_id_for_session_id(self, session_id=None):
+        """
+        Returns a user ID based on a signed Session ID
+        Args:
+            session_id (str): session ID
+        Return:
+            user id or None if the token is invalid, expired or revoked
+        """
+        user_id, _ = self._verify(session_id)
+        return user_id
+
+    def destroy_session(self, request=None):
+        """
+        Revokes the signed Session ID of a request until it expires
+        """
+        if request is None:
+            return False
+        session_id = self.session_cookie(request)
+        user_id, until = self._verify(session_id)
+        if user_id is None:
+            return False
+        self._revoked.add(session_id.rsplit('.', 1)[1], 1, until)
+        return True
+
+    def destroy_user_sessions(self, user_id=None):
+        """
+        Revokes every token issued to a user so far
+        Args:
+            user_id (str): user's user id
+        Return:
+            0, as stateless tokens cannot be counted
+        """
+        if user_id is None or not isinstance(user_id, str):
+            return 0
+        now = time.time()
+        self._revoked.add("user:" + user_id, int(now * 1000),
+                          now + self._lifetime())
+        return 0
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Definition of class SQLiteSessionStore
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from uuid import uuid4
+from .session_store import _env_int, _user_of
+
+_DATETIME = "$datetime"  # JSON key of an encoded datetime
+
+
+def _encode(value) -> str:
+    """
+    Serializes session data, datetimes included
+    """
+    def default(obj):
+        if isinstance(obj, datetime):
+            return {_DATETIME: obj.isoformat()}
+        raise TypeError("{} is not serializable".format(type(obj)))
+    return json.dumps(value, default=default)
+
+
+def _decode(text: str):
+    """
+    Deserializes session data written by _encode
+    """
+    def object_hook(obj):
+        if len(obj) == 1 and _DATETIME in obj:
+            return datetime.fromisoformat(obj[_DATETIME])
+        return obj
+    return json.loads(text, object_hook=object_hook)
+
+
+@contextmanager
+def _transaction(connection: sqlite3.Connection):
+    """
+    Runs statements in one write transaction (BEGIN IMMEDIATE), rolled
+    back on error
+    """
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        yield connection
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    connection.execute("COMMIT")
+
+
+class SQLiteSessionStore:
+    """
+    Session store shared by every process of a host.
+    Sessions are spread over SESSION_SHARDS SQLite files in WAL mode.
+    A session ID ends with ".<shard>", so a lookup goes straight to one
+    file; new sessions go to the shard of the creating process, which
+    keeps concurrent writers of different workers apart. Deadlines are
+    wall-clock timestamps so that every process agrees on them.
+    It implements the same interface as SessionStore, except that
+    eviction beyond max_size drops the oldest sessions rather than the
+    least recently used ones (tracking use would cost a write per read).
+    Only SQL understood by SQLite 3.7 (WAL) onwards is used, so neither
+    upserts (3.24) nor RETURNING (3.35): read-then-write statements run
+    in one BEGIN IMMEDIATE transaction instead.
+    """
+
+    def __init__(self, path: str = None, shards: int = None,
+                 max_size: int = None, expire_every: float = 1.0):
+        """
+        Initialize the store
+        Args:
+            path (str): prefix of the shard files, SESSION_DB_PATH or
+            ".db_sessions" by default
+            shards (int): number of shard files, SESSION_SHARDS or 4
+            max_size (int): maximum number of sessions kept, read from
+            SESSION_STORE_SIZE when not given (0 means unbounded)
+            expire_every (float): minimum seconds between two expiry
+            passes of a process
+        """
+        if path is None:
+            path = os.getenv('SESSION_DB_PATH', '.db_sessions')
+        if shards is None:
+            shards = _env_int('SESSION_SHARDS', 4)
+        if max_size is None:
+            max_size = _env_int('SESSION_STORE_SIZE', 100000)
+        self.path = path
+        self.shards = max(shards, 1)
+        self.max_size = max_size
+        self.expire_every = expire_every
+        self._next_expire = 0.0
+        self._local = threading.local()
+
+    def _file(self, shard: int) -> str:
+        """
+        Returns the file name of a shard
+        """
+        return "{}_{}.sqlite".format(self.path, shard)
+
+    def _connection(self, shard: int) -> sqlite3.Connection:
+        """
+        Returns the connection of the current thread to a shard,
+        reopening connections inherited through fork
+        """
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.pid = os.getpid()
+            local.connections = {}
+        connection = local.connections.get(shard)
+        if connection is None:
+            connection = sqlite3.connect(self._file(shard), timeout=30,
+                                         isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "deadline REAL, user_id TEXT)")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS sessions_deadline "
+                "ON sessions (deadline)")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS sessions_user_id "
+                "ON sessions (user_id)")
+            local.connections[shard] = connection
+        return connection
+
+    def _shard_of(self, session_id: str) -> int:
+        """
+        Returns the shard hinted by a session ID, None if it has none
+        """
+        if not isinstance(session_id, str):
+            return None
+        try:
+            shard = int(session_id.rsplit('.', 1)[1])
+        except (IndexError, ValueError):
+            return None
+        if shard < 0 or shard >= self.shards:
+            return None
+        return shard
+
+    def new_session_id(self) -> str:
+        """
+        Returns a new session ID routed to the shard of this process
+        """
+        return "{}.{}".format(uuid4(), os.getpid() % self.shards)
+
+    def expire(self, now: float = None) -> int:
+        """
+        Removes the sessions whose deadline has passed and, beyond
+        max_size, the oldest ones
+        Return:
+            number of sessions removed
+        """
+        if now is None:
+            now = time.time()
+        removed = 0
+        limit = self.max_size // self.shards if self.max_size > 0 else 0
+        for shard in range(self.shards):
+            connection = self._connection(shard)
+            removed += connection.execute(
+                "DELETE FROM sessions WHERE deadline <= ?",
+                (now,)).rowcount
+            if limit > 0:
+                count = connection.execute(
+                    "SELECT COUNT(*) FROM sessions").fetchone()[0]
+                if count > limit:
+                    removed += connection.execute(
+                        "DELETE FROM sessions WHERE rowid IN (SELECT rowid "
+                        "FROM sessions ORDER BY rowid LIMIT ?)",
+                        (count - limit,)).rowcount
+        return removed
+
+    def _maybe_expire(self):
+        """
+        Runs expire at most once every expire_every seconds
+        """
+        now = time.time()
+        if now >= self._next_expire:
+            self._next_expire = now + self.expire_every
+            self.expire(now)
+
+    def set(self, session_id: str, value, ttl: int = None):
+        """
+        Stores the data of a session
+        Args:
+            session_id (str): session ID carrying a shard hint
+            value: session data (JSON serializable, datetimes allowed)
+            ttl (int): seconds before the session expires, None to keep
+            the current deadline, 0 or less for no deadline
+        """
+        shard = self._shard_of(session_id)
+        if shard is None:
+            raise KeyError(session_id)
+        self._maybe_expire()
+        connection = self._connection(shard)
+        if ttl is None:
+            params = (_encode(value), _user_of(value), session_id)
+            with _transaction(connection):
+                if connection.execute(
+                        "UPDATE sessions SET value = ?, user_id = ? "
+                        "WHERE session_id = ?", params).rowcount == 0:
+                    connection.execute(
+                        "INSERT INTO sessions (value, user_id, session_id) "
+                        "VALUES (?, ?, ?)", params)
+        else:
+            deadline = time.time() + ttl if ttl > 0 else None
+            connection.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, value, "
+                "deadline, user_id) VALUES (?, ?, ?, ?)",
+                (session_id, _encode(value), deadline, _user_of(value)))
+
+    def get(self, session_id: str, default=None):
+        """
+        Returns the data of a live session
+        """
+        shard = self._shard_of(session_id)
+        if shard is None:
+            return default
+        self._maybe_expire()
+        row = self._connection(shard).execute(
+            "SELECT value, deadline FROM sessions WHERE session_id = ?",
+            (session_id,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return default
+        return _decode(row[0])
+
+    def pop(self, session_id: str, default=None):
+        """
+        Removes a session and returns its data
+        """
+        shard = self._shard_of(session_id)
+        if shard is None:
+            return default
+        connection = self._connection(shard)
+        with _transaction(connection):
+            row = connection.execute(
+                "SELECT value FROM sessions WHERE session_id = ?",
+                (session_id,)).fetchone()
+            if row is not None:
+                connection.execute(
+                    "DELETE FROM sessions WHERE session_id = ?",
+                    (session_id,))
+        if row is None:
+            return default
+        return _decode(row[0])
+
+    def session_ids_of(self, user_id: str) -> list:
+        """
+        Returns the live session IDs of a user, through the user_id index
+        of every shard
+        """
+        now = time.time()
+        session_ids = []
+        for shard in range(self.shards):
+            session_ids.extend(row[0] for row in self._connection(
+                shard).execute(
+                "SELECT session_id FROM sessions WHERE user_id = ? AND "
+                "(deadline IS NULL OR deadline > ?)", (user_id, now)))
+        return session_ids
+
+    def pop_user(self, user_id: str) -> int:
+        """
+        Removes every session of a user
+        Return:
+            number of sessions removed
+        """
+        return sum(self._connection(shard).execute(
+            "DELETE FROM sessions WHERE user_id = ?", (user_id,)).rowcount
+            for shard in range(self.shards))
+
+    def clear(self):
+        """
+        Removes every session
+        """
+        for shard in range(self.shards):
+            self._connection(shard).execute("DELETE FROM sessions")
+
+    def __setitem__(self, session_id: str, value):
+        """
+        Stores the data of a session, keeping its current deadline
+        """
+        self.set(session_id, value)
+
+    def __getitem__(self, session_id: str):
+        """
+        Returns the data of a live session, KeyError if there is none
+        """
+        missing = object()
+        value = self.get(session_id, missing)
+        if value is missing:
+            raise KeyError(session_id)
+        return value
+
+    def __delitem__(self, session_id: str):
+        """
+        Removes a session, KeyError if there is none
+        """
+        missing = object()
+        if self.pop(session_id, missing) is missing:
+            raise KeyError(session_id)
+
+    def __contains__(self, session_id: str) -> bool:
+        """
+        True if the session is live
+        """
+        missing = object()
+        return self.get(session_id, missing) is not missing
+
+    def __len__(self) -> int:
+        """
+        Number of sessions stored
+        """
+        return sum(self._connection(shard).execute(
+            "SELECT COUNT(*) FROM sessions").fetchone()[0]
+            for shard in range(self.shards))
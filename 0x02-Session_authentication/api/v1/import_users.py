@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+""" Bulk import of users from CSV or NDJSON
+    python3 -m api.v1.import_users users.csv [--workers N] [--batch N]
+Rows hold email, password and optionally first_name and last_name.
+Users are built and their passwords hashed in worker processes, emails
+already stored or seen earlier in the input are skipped, and the user
+file is written once. The lock of the user file is held meanwhile, so
+the saves of a running API wait for the import, after which the API
+reloads the file.
+"""
+import argparse
+import csv
+import json
+import os
+import shutil
+import sys
+import time
+from collections import deque
+from multiprocessing import Pool
+from typing import Iterator, List
+from models.encoder import dumps
+from models.user import User
+
+
+def read_rows(file_path: str, file_format: str = None) -> Iterator[dict]:
+    """ Yield the rows of a CSV (with a header line) or NDJSON file,
+    one at a time
+    """
+    if file_format is None:
+        file_format = "csv" if file_path.endswith(".csv") else "ndjson"
+    with open(file_path, 'r', newline='') as f:
+        if file_format == "csv":
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def batches(rows: Iterator[dict], size: int) -> Iterator[List[dict]]:
+    """ Group rows into lists of up to size rows
+    """
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def build_users(rows: List[dict]) -> list:
+    """ Build the users of a batch, hashing their passwords
+    Return:
+        list of (email, encoded '"<id>":{...}' entry of the user file),
+        None instead of an entry for a row without email or password
+    """
+    built = []
+    for row in rows:
+        email, password = row.get("email"), row.get("password")
+        if not email or not password:
+            built.append((email, None))
+            continue
+        user = User()
+        user.email = email
+        user.password = password
+        user.first_name = row.get("first_name") or None
+        user.last_name = row.get("last_name") or None
+        built.append((email, dumps(user.id) + b':' +
+                      dumps(user.to_json(True))))
+    return built
+
+
+def _built_batches(rows: Iterator[dict], workers: int,
+                   size: int) -> Iterator[list]:
+    """ Yield the built batches in input order, keeping at most two
+    batches per worker in flight so the input is read as it is consumed
+    """
+    if workers <= 0:
+        for batch in batches(rows, size):
+            yield build_users(batch)
+        return
+    with Pool(workers) as pool:
+        pending = deque()
+        for batch in batches(rows, size):
+            pending.append(pool.apply_async(build_users, (batch,)))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def import_users(file_path: str, file_format: str = None,
+                 workers: int = None, size: int = 5000) -> dict:
+    """ Append the users of an input file to the user file
+    (.db_User.json), written to a temporary copy then moved in place.
+    The copy is removed if the import fails, leaving the file unchanged
+    Return:
+        counts of imported, duplicate and invalid rows
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    db_path = ".db_{}.json".format(User.__name__)
+    with User.locked():
+        emails = set()
+        if os.path.exists(db_path):
+            with open(db_path, 'r') as f:
+                emails.update(json.load(f, object_hook=_email_of).values())
+        counts = {"imported": 0, "duplicates": 0, "invalid": 0}
+        tmp_path = "{}.{}.tmp".format(db_path, os.getpid())
+        try:
+            with open(tmp_path, 'w+b') as out:
+                _write_entries(out, db_path, emails, counts,
+                               _built_batches(read_rows(file_path,
+                                                        file_format),
+                                              workers, size))
+            os.replace(tmp_path, db_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+    return counts
+
+
+def _write_entries(out, db_path: str, emails: set, counts: dict,
+                   built_batches: Iterator[list]):
+    """ Write the stored entries then the new users of each built batch
+    to out, skipping invalid rows and known emails and counting each
+    """
+    separator = _copy_entries(db_path, out)
+    for built in built_batches:
+        entries = []
+        for email, entry in built:
+            if entry is None:
+                counts["invalid"] += 1
+            elif email in emails:
+                counts["duplicates"] += 1
+            else:
+                emails.add(email)
+                entries.append(entry)
+        if entries:
+            out.write(separator + b', '.join(entries))
+            separator = b', '
+            counts["imported"] += len(entries)
+    out.write(b'}')
+
+
+def _email_of(obj_json: dict):
+    """ object_hook reducing each stored user to its email while the
+    user file is parsed, so the records are never all held in memory
+    """
+    if "id" in obj_json and "created_at" in obj_json:
+        return obj_json.get("email")
+    return obj_json
+
+
+def _copy_entries(db_path: str, out) -> bytes:
+    """ Copy the user file to out without its closing brace
+    Return:
+        separator to write before the next entry
+    """
+    if not os.path.exists(db_path):
+        out.write(b'{')
+        return b''
+    with open(db_path, 'rb') as f:
+        shutil.copyfileobj(f, out)
+    end = out.seek(0, os.SEEK_END)
+    start = max(end - 64, 0)
+    out.seek(start)
+    tail = out.read()
+    brace = tail.rindex(b'}')
+    out.seek(start + brace)
+    out.truncate()
+    return b', ' if tail[:brace].rstrip().endswith(b'}') else b''
+
+
+def main():
+    """ Command line entry point
+    """
+    parser = argparse.ArgumentParser(
+        description="Bulk import users from CSV or NDJSON")
+    parser.add_argument("file", help="input file (.csv or NDJSON)")
+    parser.add_argument("--format", choices=("csv", "ndjson"),
+                        help="input format, from the extension by default")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="hashing processes (CPU count by default, "
+                        "0 to hash in this process)")
+    parser.add_argument("--batch", type=int, default=5000,
+                        help="rows per batch sent to a worker")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    counts = import_users(args.file, args.format, args.workers, args.batch)
+    duration = time.perf_counter() - start
+    total = sum(counts.values())
+    print("{imported} imported, {duplicates} duplicates, {invalid} invalid"
+          .format(**counts), "in {:.1f}s ({:.0f} rows/s)".format(
+              duration, total / duration if duration else 0),
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Pre-fork entry point for production serving:
+    API_HOST=0.0.0.0 API_PORT=5000 API_WORKERS=4 python3 -m api.v1.prefork
+The master loads the stored data once, freezes it out of the garbage
+collector and forks the workers, which share its pages copy-on-write.
+Sending SIGUSR1 to the master prints the shared and private memory of
+every worker. Each worker serves its requests from a thread each
+(API_THREADED=0 for one at a time), so that the admission control of
+the app sees the concurrent requests of a worker and can shed them.
+Workers write the .db_*.json files one at a time, under a lock file,
+after reloading the changes of the others (see models.base.file_lock);
+sessions must be shared too (SESSION_BACKEND=sqlite) to run more than
+one worker.
+"""
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from werkzeug.serving import make_server
+from api.v1.app import create_app
+
+RESPAWN_WINDOW = 10  # Seconds; workers exiting sooner count as failures
+RESPAWN_MAX_DELAY = 30  # Seconds; longest wait before replacing a worker
+
+
+def memory_usage(pid: int) -> dict:
+    """ Returns the resident memory of a process in kB, split into
+    shared and private pages, from /proc/<pid>/smaps_rollup
+    Return:
+        dict with rss, pss, shared and private, None if unavailable
+    """
+    fields = {}
+    try:
+        with open("/proc/{}/smaps_rollup".format(pid)) as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if value.strip().endswith('kB'):
+                    fields[name] = int(value.split()[0])
+    except (OSError, ValueError):
+        return None
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "shared": fields.get("Shared_Clean", 0) +
+        fields.get("Shared_Dirty", 0),
+        "private": fields.get("Private_Clean", 0) +
+        fields.get("Private_Dirty", 0)
+    }
+
+
+def memory_report(pids) -> str:
+    """ Returns a table of the memory usage of each process in kB
+    """
+    lines = ["{:>8} {:>10} {:>10} {:>10} {:>10}".format(
+        "pid", "rss", "pss", "shared", "private")]
+    for pid in pids:
+        usage = memory_usage(pid)
+        if usage is None:
+            lines.append("{:>8} {:>10}".format(pid, "n/a"))
+            continue
+        lines.append("{:>8} {rss:>10} {pss:>10} {shared:>10} "
+                     "{private:>10}".format(pid, **usage))
+    return "\n".join(lines)
+
+
+def unshared_state(auth) -> str:
+    """ Returns why the state of an auth instance cannot be shared by
+    several worker processes, None if it can
+    """
+    from api.v1.auth.session_auth import SessionAuth
+    if isinstance(auth, SessionAuth) and \
+            os.getenv('SESSION_BACKEND', 'memory') != 'sqlite':
+        return "{} keeps its sessions in each process, set " \
+            "SESSION_BACKEND=sqlite".format(type(auth).__name__)
+    return None
+
+
+def admission_summary(admission, threaded: bool) -> str:
+    """ Describes what the admission control of the workers can shed
+    """
+    if threaded:
+        limits = "concurrent requests of a worker beyond the limits"
+    else:
+        limits = "nothing on concurrency (one request at a time per " \
+            "worker, API_THREADED=0)"
+    if admission.trusted:
+        queue = "requests queued too long per X-Request-Start from {}" \
+            .format(", ".join(sorted(admission.trusted)))
+    else:
+        queue = "no queued requests (set ADMISSION_TRUSTED_PROXIES to " \
+            "trust the X-Request-Start header of a front proxy)"
+    return "Admission control sheds {}; and {}".format(limits, queue)
+
+
+def exit_code(status: int) -> int:
+    """ Returns the exit code of a wait status, minus the signal number
+    for a process killed by a signal
+    """
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+class PreforkServer:
+    """ Serves one application from several forked worker processes
+    accepting connections on a socket opened by the master
+    """
+
+    def __init__(self, app, host: str, port: int, workers: int,
+                 threaded: bool = True):
+        """ Initialize the server
+        Args:
+            app: WSGI application, its data already loaded
+            host (str): address to listen on
+            port (int): port to listen on
+            workers (int): number of worker processes
+            threaded (bool): serve the requests of a worker from a
+            thread each, else one at a time
+        Raise:
+            ValueError if several workers cannot share the auth state
+            of the app (app.extensions['auth'])
+        """
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = max(workers, 1)
+        self.threaded = threaded
+        self.auth = getattr(app, 'extensions', {}).get('auth')
+        if self.workers > 1:
+            reason = unshared_state(self.auth)
+            if reason is not None:
+                raise ValueError("Cannot run {} workers: {}".format(
+                    self.workers, reason))
+        self.pids = set()
+        self._started = {}  # pid -> monotonic time of its fork
+        self._failures = 0  # workers in a row exiting within the window
+        self._socket = None
+        self._stopping = False
+
+    def _listen(self):
+        """ Opens the listening socket shared by the workers
+        """
+        family = socket.AF_INET6 if ':' in self.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(128)
+        sock.set_inheritable(True)
+        self._socket = sock
+
+    def _make_server(self):
+        """ Returns the WSGI server of a worker, on the shared socket
+        """
+        return make_server(self.host, self.port, self.app,
+                           threaded=self.threaded,
+                           fd=self._socket.fileno())
+
+    def _spawn(self):
+        """ Forks a worker; the worker never returns.
+        On SIGTERM the worker closes the auth instance (last session
+        snapshot, pending refreshes) and exits with 0; an error is logged
+        and exits with 1
+        """
+        pid = os.fork()
+        if pid:
+            self.pids.add(pid)
+            self._started[pid] = time.monotonic()
+            return
+        signal.signal(signal.SIGTERM, _terminate)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+        gc.enable()
+        code = 0
+        try:
+            self._make_server().serve_forever()
+        except SystemExit:
+            pass
+        except BaseException:
+            logging.getLogger(__name__).exception(
+                "Worker %d failed", os.getpid())
+            code = 1
+        try:
+            if self.auth is not None:
+                self.auth.close()
+        except BaseException:
+            logging.getLogger(__name__).exception(
+                "Worker %d failed to close its auth", os.getpid())
+            code = 1
+        finally:
+            sys.stderr.flush()
+            os._exit(code)
+
+    def _respawn_delay(self, pid: int, status: int) -> float:
+        """ Logs the exit of a worker and returns the seconds to wait
+        before replacing it, doubling from 0.5 up to RESPAWN_MAX_DELAY
+        while workers keep exiting within RESPAWN_WINDOW seconds
+        """
+        lived = time.monotonic() - self._started.pop(pid, 0.0)
+        if lived < RESPAWN_WINDOW:
+            self._failures += 1
+        else:
+            self._failures = 0
+        delay = 0.0
+        if self._failures > 0:
+            delay = min(RESPAWN_MAX_DELAY, 0.5 * 2 ** (self._failures - 1))
+        logging.getLogger(__name__).error(
+            "Worker %d exited with status %d after %.1fs, respawning in "
+            "%.1fs", pid, exit_code(status), lived, delay)
+        return delay
+
+    def _report(self, signum, frame):
+        """ Prints the memory report of the master and the workers
+        """
+        print(memory_report([os.getpid()] + sorted(self.pids)),
+              file=sys.stderr, flush=True)
+
+    def _stop(self, signum, frame):
+        """ Stops the workers, then the master once they exited
+        """
+        self._stopping = True
+        for pid in self.pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def serve_forever(self):
+        """ Forks the workers and replaces those that die until SIGTERM
+        or SIGINT
+        """
+        self._listen()
+        signal.signal(signal.SIGUSR1, self._report)
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for _ in range(self.workers):
+            self._spawn()
+        while self.pids:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            self.pids.discard(pid)
+            if self._stopping:
+                continue
+            deadline = time.monotonic() + self._respawn_delay(pid, status)
+            while not self._stopping and time.monotonic() < deadline:
+                time.sleep(0.1)
+            if not self._stopping:
+                self._spawn()
+        self._socket.close()
+
+
+def _terminate(signum, frame):
+    """ SIGTERM handler of the workers, unwinding serve_forever
+    """
+    raise SystemExit(0)
+
+
+def main():
+    """ Loads the data, freezes it and serves it from API_WORKERS
+    forked workers
+    """
+    host = os.getenv("API_HOST", "0.0.0.0")
+    port = int(os.getenv("API_PORT", "5000"))
+    try:
+        workers = int(os.getenv("API_WORKERS", os.cpu_count() or 1))
+    except ValueError:
+        workers = 1
+    # Objects allocated while loading stay out of collections, which
+    # would otherwise write to their headers and unshare their pages
+    gc.disable()
+    app = create_app(preload=True)
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+    threaded = os.getenv("API_THREADED", "1") != "0"
+    try:
+        server = PreforkServer(app, host, port, workers, threaded)
+    except ValueError as e:
+        sys.exit(str(e))
+    print("Serving on {}:{} with {} {}workers (master {})".format(
+        host, port, server.workers, "threaded " if threaded else "",
+        os.getpid()), file=sys.stderr, flush=True)
+    admission = app.extensions.get('admission')
+    if admission is not None:
+        print(admission_summary(admission, threaded), file=sys.stderr,
+              flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
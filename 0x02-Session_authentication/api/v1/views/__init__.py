@@ -1,12 +1,32 @@
 #!/usr/bin/env python3
 """ DocDocDocDocDocDoc
 """
+from os import getenv
+from threading import Event
 from flask import Blueprint
 
 app_views = Blueprint("app_views", __name__, url_prefix="/api/v1")
+data_ready = Event()  # Set once load_data has loaded the stored objects
 
 from api.v1.views.index import *
 from api.v1.views.users import *
 from api.v1.views.session_auth import *
 
-User.load_from_file()
+if getenv("COLUMNAR_STORE"):
+    from models.columns import mirror
+    mirror(User, strings=('email', 'first_name', 'last_name'))
+
+
+def load_data(*loaders):
+    """ Loads the stored users, runs each extra loader (e.g. the
+    sessions of the auth instance), then sets data_ready.
+    With MAPPED_STORE set, users are read from a memory-mapped index
+    shared by the worker processes instead of being loaded in each one
+    """
+    if getenv("MAPPED_STORE"):
+        User.load_from_index()
+    else:
+        User.load_from_file()
+    for loader in loaders:
+        loader()
+    data_ready.set()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+""" Conditional GET and compression helpers of the views
+"""
+import zlib
+from os import getenv
+from flask import current_app, request
+from api.v1.metrics import timed
+
+try:
+    COMPRESS_MIN_SIZE = int(getenv("COMPRESS_MIN_SIZE", 1024))
+except ValueError:
+    COMPRESS_MIN_SIZE = 1024
+COMPRESS_LEVEL = 6  # zlib level: most of the size gain of 9 at half its CPU
+_WBITS = {"gzip": 16 + zlib.MAX_WBITS, "deflate": zlib.MAX_WBITS}
+
+
+def not_modified(etag: str) -> bool:
+    """ True if the request already holds the representation tagged etag
+    (If-None-Match), so a 304 can be sent without serializing anything
+    """
+    return request.if_none_match.contains_weak(etag)
+
+
+def unchanged(etag: str):
+    """ Returns the body-less 304 response of etag
+    """
+    return tagged(current_app.response_class(status=304), etag)
+
+
+def tagged(response, etag: str):
+    """ Tags a response with a weak ETag, weak as the body may be
+    compressed
+    """
+    response.set_etag(etag, weak=True)
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+@timed("serialization")
+def compress(response):
+    """ Compresses a response body of at least COMPRESS_MIN_SIZE bytes
+    with gzip or deflate, whichever the client accepts first
+    """
+    if response.status_code != 200 or response.direct_passthrough or \
+            'Content-Encoding' in response.headers:
+        return response
+    encoding = None
+    for candidate in ("gzip", "deflate"):
+        if candidate in request.accept_encodings:
+            encoding = candidate
+            break
+    response.vary.add('Accept-Encoding')
+    if encoding is None or \
+            response.calculate_content_length() < COMPRESS_MIN_SIZE:
+        return response
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED,
+                                  _WBITS[encoding])
+    data = compressor.compress(response.get_data()) + compressor.flush()
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -1,31 +1,75 @@
 #!/usr/bin/env python3
 """ Module of Index views
 """
-from flask import jsonify, abort
-from api.v1.views import app_views
+from flask import current_app, jsonify, abort, request
+from api.v1.views import app_views, data_ready
+from models.aggregates import AGGREGATES
+
+STATS_LIMIT = 10  # Default number of groups per aggregate of /stats
+STATS_MAX_LIMIT = 100  # Upper bound accepted for the limit parameter
 
 
 @app_views.route('/status', methods=['GET'], strict_slashes=False)
 def status() -> str:
     """ GET /api/v1/status
     Return:
-      - the status of the API
+      - the status of the API and whether the stored data is loaded
     """
-    return jsonify({"status": "OK"})
+    return jsonify({"status": "OK", "ready": data_ready.is_set()})
 
 
 @app_views.route('/stats/', strict_slashes=False)
 def stats() -> str:
     """ GET /api/v1/stats
+    Query parameters:
+      - limit (optional): number of largest groups returned per
+        aggregate
     Return:
-      - the number of each objects
+      - the number of each objects and the maintained aggregates
+        (objects created per day, users per email domain,
+        sessions per user), each as its number of distinct keys and its
+        limit largest groups, the hit rate of the basic_auth
+        verified-credential cache, the session_db_auth sweeper
+        counters, the login rate limiter counters and the admission
+        control limits
     """
-    from models.user import User
-    stats = {}
-    stats['users'] = User.count()
+    auth = current_app.extensions.get('auth')
+    from api.v1.views.session_auth import login_limiter
+    try:
+        limit = int(request.args.get('limit', STATS_LIMIT))
+    except ValueError:
+        limit = 0
+    if limit <= 0:
+        return jsonify({'error': "Wrong limit"}), 400
+    stats = AGGREGATES.to_json(min(limit, STATS_MAX_LIMIT))
+    stats['users'] = AGGREGATES.count('User')
+    if hasattr(auth, 'cache_stats'):
+        stats['basic_auth_cache'] = auth.cache_stats()
+    if hasattr(auth, 'sweeper'):
+        stats['session_sweeper'] = auth.sweeper.stats()
+    stats['login_rate_limit'] = login_limiter.stats()
+    if 'admission' in current_app.extensions:
+        stats['admission'] = current_app.extensions['admission'].stats()
     return jsonify(stats)
 
 
+@app_views.route('/metrics', methods=['GET'], strict_slashes=False)
+def metrics() -> str:
+    """ GET /api/v1/metrics
+    Return:
+      - the request latency histograms and the time spent in each
+        phase, in the Prometheus text format (metrics of this process)
+      - 404 if the metrics are disabled (METRICS=0) or the client
+        address is not in METRICS_ALLOW
+    """
+    metrics = current_app.extensions.get('metrics')
+    if metrics is None or not metrics.allows(request.remote_addr):
+        abort(404)
+    return current_app.response_class(
+        metrics.render(),
+        mimetype='text/plain; version=0.0.4')
+
+
 @app_views.route('/unauthorized/', strict_slashes=False)
 def unauthorized() -> None:
     """GET /api/v1/unauthorized
@@ -2,11 +2,16 @@
 """
 Module of Users views
 """
+import math
 import os
-from flask import jsonify, request
+from flask import abort, current_app, jsonify, request
+from api.v1.admission import client_address
+from api.v1.auth.rate_limit import LoginRateLimiter
 from api.v1.views import app_views
 from models.user import User
 
+login_limiter = LoginRateLimiter()
+
 
 @app_views.route('/auth_session/login', methods=['POST'], strict_slashes=False)
 def auth_session():
@@ -14,7 +19,8 @@ def auth_session():
     This function handle user login
     Return:
         returns a dictionary representation of
-        user if found else error message
+        user if found else error message,
+        503 if no session can be created (e.g. revocation list full)
     """
     email = request.form.get('email')
     password = request.form.get('password')
@@ -22,13 +28,22 @@ def auth_session():
         return jsonify({"error": "email missing"}), 400
     if password is None or password == '':
         return jsonify({"error": "password missing"}), 400
+    ip = client_address(request.environ,
+                        current_app.extensions.get('trusted_proxies', ()))
+    wait = login_limiter.check(ip, email)
+    if wait:
+        return jsonify({"error": "Too Many Requests"}), 429, \
+            {"Retry-After": str(math.ceil(wait))}
     users = User.search({"email": email})
     if not users or users == []:
         return jsonify({"error": "no user found for this email"}), 404
     for user in users:
         if user.is_valid_password(password):
-            from api.v1.app import auth
+            login_limiter.succeeded(ip, email)
+            auth = current_app.extensions['auth']
             session_id = auth.create_session(user.id)
+            if session_id is None:
+                abort(503)
             resp = jsonify(user.to_json())
             session_name = os.getenv('SESSION_NAME')
             resp.set_cookie(session_name, session_id)
@@ -42,7 +57,7 @@ def handle_logout():
     """
     This function handle user logout
     """
-    from api.v1.app import auth
+    auth = current_app.extensions['auth']
     if auth.destroy_session(request):
         return jsonify({}), 200
     abort(404)
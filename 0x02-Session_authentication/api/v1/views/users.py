@@ -2,27 +2,119 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from api.v1.json_provider import json_array, json_response
+from api.v1.views.caching import compress, not_modified, tagged, unchanged
+from flask import Response, abort, current_app, jsonify, request
 from models.user import User
+from models.text_index import index
+
+SEARCH_LIMIT = 20  # Default number of results of /users/search
+SEARCH_MAX_LIMIT = 100  # Upper bound accepted for the limit parameter
+EXPORT_CHUNK = 1000  # Users per chunk of /users/export
+user_index = index(User, prefix=('email', 'first_name', 'last_name'),
+                   contains=('first_name', 'last_name'))
+
+
+def _fields() -> tuple:
+    """ Attributes requested by the fields query parameter
+    (comma-separated), None to get them all
+    """
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    return tuple(dict.fromkeys(field.strip() for field in fields.split(',')
+                               if field.strip()))
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters:
+      - fields (optional): comma-separated attributes to return
+    Return:
+      - list of all User objects JSON represented, compressed when large
+      - 304 if If-None-Match holds the ETag of the current users
+    """
+    etag = "users-{}".format(User.version())
+    if not_modified(etag):
+        return unchanged(etag)
+    fields = _fields()
+    body = json_array(user.to_json_bytes(fields) for user in User.all())
+    return tagged(compress(json_response(body)), etag)
+
+
+@app_views.route('/users/export', methods=['GET'], strict_slashes=False)
+def export_users() -> str:
+    """ GET /api/v1/users/export
+    Query parameters:
+      - fields (optional): comma-separated attributes to export
     Return:
-      - list of all User objects JSON represented
+      - every User JSON represented, one per line (NDJSON), streamed in
+        chunks so memory stays constant whatever the number of users
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    fields = _fields()
+
+    def generate():
+        """ Yields the NDJSON lines, EXPORT_CHUNK users at a time
+        """
+        lines = []
+        for user in User.iterate():
+            lines.append(user.to_json_bytes(fields))
+            if len(lines) >= EXPORT_CHUNK:
+                lines.append(b'')
+                yield b'\n'.join(lines)
+                lines = []
+        if lines:
+            lines.append(b'')
+            yield b'\n'.join(lines)
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
+@app_views.route('/users/search', methods=['GET'], strict_slashes=False)
+def search_users() -> str:
+    """ GET /api/v1/users/search
+    Query parameters:
+      - q: matched against the start of the email or anywhere in
+        first_name/last_name (case-insensitive)
+      - limit (optional): maximum number of users returned
+      - fields (optional): comma-separated attributes to return
+    Return:
+      - list of matching User objects JSON represented
+      - 400 if q is missing or limit is not a positive integer
+    """
+    query = request.args.get('q', '')
+    if query == '':
+        return jsonify({'error': "q missing"}), 400
+    try:
+        limit = int(request.args.get('limit', SEARCH_LIMIT))
+    except ValueError:
+        limit = 0
+    if limit <= 0:
+        return jsonify({'error': "Wrong limit"}), 400
+    limit = min(limit, SEARCH_MAX_LIMIT)
+    found = user_index.starts_with('email', query, limit)
+    if len(found) < limit:
+        for user_id in user_index.contains(query, limit):
+            if user_id not in found:
+                found.append(user_id)
+                if len(found) >= limit:
+                    break
+    users = [User.get(user_id) for user_id in found]
+    fields = _fields()
+    return compress(json_response(json_array(
+        user.to_json_bytes(fields) for user in users if user is not None)))
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
 def view_one_user(user_id: str = None) -> str:
     """ GET /api/v1/users/:id
     Path parameter:
-      - User ID
+      - User ID ("me" for the current user)
+    Query parameters:
+      - fields (optional): comma-separated attributes to return
     Return:
       - User object JSON represented
+      - 304 if If-None-Match holds the ETag of the User
       - 404 if the User ID doesn't exist
     """
     if user_id is None:
@@ -31,13 +123,23 @@ def view_one_user(user_id: str = None) -> str:
         if request.current_user is None:
             abort(404)
         user = request.current_user
-        return jsonify(user.to_json())
-    user = User.get(user_id)
-    if user is None:
-        abort(404)
-    if request.current_user is None:
-        abort(404)
-    return jsonify(user.to_json())
+    else:
+        user = User.get(user_id)
+        if user is None:
+            abort(404)
+        if request.current_user is None:
+            abort(404)
+    etag = _user_etag(user)
+    if not_modified(etag):
+        return unchanged(etag)
+    return tagged(json_response(user.to_json_bytes(_fields())), etag)
+
+
+def _user_etag(user: User) -> str:
+    """ ETag of a User, changing whenever it is saved
+    """
+    return "user-{}-{:x}".format(user.id,
+                                 int(user.updated_at.timestamp() * 1000000))
 
 
 @app_views.route('/users/<user_id>', methods=['DELETE'], strict_slashes=False)
@@ -58,6 +160,27 @@ def delete_user(user_id: str = None) -> str:
     return jsonify({}), 200
 
 
+@app_views.route('/users/<user_id>/sessions', methods=['DELETE'],
+                 strict_slashes=False)
+def delete_user_sessions(user_id: str = None) -> str:
+    """ DELETE /api/v1/users/:id/sessions
+    Path parameter:
+      - User ID
+    Return:
+      - empty JSON once every session of the User has been destroyed
+      - 404 if the User ID doesn't exist
+    """
+    if user_id is None:
+        abort(404)
+    user = User.get(user_id)
+    if user is None:
+        abort(404)
+    auth = current_app.extensions.get('auth')
+    if hasattr(auth, 'destroy_user_sessions'):
+        auth.destroy_user_sessions(user.id)
+    return jsonify({}), 200
+
+
 @app_views.route('/users', methods=['POST'], strict_slashes=False)
 def create_user() -> str:
     """ POST /api/v1/users/
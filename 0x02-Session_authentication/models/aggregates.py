@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+""" Incrementally maintained counters over the in-memory storage
+"""
+from collections import Counter
+from threading import RLock
+from models.base import HOOKS, TIMESTAMP_FORMAT
+
+
+def _created_day(obj) -> str:
+    """ Day an object was created, as YYYY-MM-DD
+    """
+    if obj.created_at is None:
+        return None
+    return obj.created_at.strftime(TIMESTAMP_FORMAT)[:10]
+
+
+def _email_domain(obj) -> str:
+    """ Domain part of a User email
+    """
+    email = getattr(obj, 'email', None)
+    if not isinstance(email, str) or '@' not in email:
+        return None
+    return email.rsplit('@', 1)[1].lower()
+
+
+def _user_id(obj) -> str:
+    """ Owner of a UserSession
+    """
+    return getattr(obj, 'user_id', None)
+
+
+# Groupings maintained for every class, then per class name
+COMMON_GROUPS = {'created_per_day': _created_day}
+CLASS_GROUPS = {
+    'User': {'users_per_email_domain': _email_domain},
+    'UserSession': {'sessions_per_user': _user_id},
+}
+
+
+class Aggregates:
+    """ Object counts and group-by counters for every model class
+
+    Base.save/remove/load_from_file notify `hook`, which moves each object
+    from the groups of its previous values to the groups of its current
+    ones, so reading a statistic never scans the storage. Updates and
+    reads hold one lock, as the hooks run on the request threads.
+    """
+
+    def __init__(self):
+        """ Initialize empty counters
+        """
+        self._counts = {}
+        self._groups = {}
+        self._keys = {}
+        self._lock = RLock()
+
+    def _groupers(self, s_class: str) -> dict:
+        """ Grouping functions applied to a class
+        """
+        groupers = dict(COMMON_GROUPS)
+        groupers.update(CLASS_GROUPS.get(s_class, {}))
+        return groupers
+
+    def clear(self, s_class: str):
+        """ Reset the counters of a class
+        """
+        self._counts[s_class] = 0
+        self._groups[s_class] = {name: Counter()
+                                 for name in self._groupers(s_class)}
+        self._keys[s_class] = {}
+
+    def _move(self, s_class: str, old: dict, new: dict):
+        """ Shift one object from its old group keys to its new ones
+        """
+        groups = self._groups[s_class]
+        for name, counter in groups.items():
+            before, after = old.get(name), new.get(name)
+            if before == after:
+                continue
+            if before is not None:
+                counter[before] -= 1
+                if counter[before] <= 0:
+                    del counter[before]
+            if after is not None:
+                counter[after] += 1
+
+    def add(self, obj):
+        """ Count a saved object, or update its groups if already counted
+        """
+        s_class = obj.__class__.__name__
+        if s_class not in self._keys:
+            self.clear(s_class)
+        keys = self._keys[s_class]
+        new = {name: fn(obj)
+               for name, fn in self._groupers(s_class).items()}
+        old = keys.get(obj.id)
+        if old is None:
+            self._counts[s_class] += 1
+            old = {}
+        keys[obj.id] = new
+        self._move(s_class, old, new)
+
+    def discard(self, obj):
+        """ Stop counting a removed object
+        """
+        s_class = obj.__class__.__name__
+        old = self._keys.get(s_class, {}).pop(obj.id, None)
+        if old is None:
+            return
+        self._counts[s_class] -= 1
+        self._move(s_class, old, {})
+
+    def hook(self, event: str, obj):
+        """ Storage hook registered in models.base.HOOKS
+        """
+        with self._lock:
+            if event == "clear":
+                self.clear(obj.__name__)
+            elif event == "save":
+                self.add(obj)
+            elif event == "remove":
+                self.discard(obj)
+
+    def count(self, s_class: str) -> int:
+        """ Number of objects of a class
+        """
+        return self._counts.get(s_class, 0)
+
+    def group(self, s_class: str, name: str) -> dict:
+        """ Copy of one group-by counter of a class
+        """
+        with self._lock:
+            return dict(self._groups.get(s_class, {}).get(name, {}))
+
+    def to_json(self, limit: int = 10) -> dict:
+        """ Every counter, JSON represented. A group-by counter is
+        summarized as its number of distinct keys and its limit largest
+        groups, so the size doesn't grow with the number of objects
+        """
+        with self._lock:
+            result = {'counts': dict(self._counts)}
+            for s_class, groups in self._groups.items():
+                for name, counter in groups.items():
+                    summary = {'distinct': len(counter),
+                               'top': dict(counter.most_common(limit))}
+                    if name in COMMON_GROUPS:
+                        result.setdefault(name, {})[s_class] = summary
+                    else:
+                        result[name] = summary
+        return result
+
+
+AGGREGATES = Aggregates()
+HOOKS.append(AGGREGATES.hook)
@@ -1,15 +1,113 @@
 #!/usr/bin/env python3
 """ Base module
 """
+from contextlib import contextmanager
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
+from typing import TypeVar, List, Iterable, Iterator
+from os import path, getenv
+from collections import OrderedDict
+from threading import RLock
+import fcntl
 import json
+import os
 import uuid
+from models.encoder import dumps
 
 # Constants
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"  # Format for datetime serialization
 DATA = {}  # In-memory storage for all objects
+HOOKS = []  # Callables notified of storage changes: hook(event, obj)
+COLUMNS = {}  # Optional columnar mirrors, keyed by class name
+MAPPED = {}  # Optional memory-mapped indexes, keyed by class name
+GENERATIONS = {}  # Class name -> (storage events, last change timestamp)
+# Serializes the changes of the storage, their hooks and the file writes
+# (request threads, session sweeper, data loader)
+STORAGE_LOCK = RLock()
+FILES = {}  # Class name -> (class, signature of its file as last read/written)
+_FILE_LOCKS = {}  # Lock file path -> [descriptor, depth], STORAGE_LOCK held
+ENCODED = OrderedDict()  # Object ID -> (fields, updated_at, JSON bytes), LRU
+try:
+    ENCODED_MAX = int(getenv("JSON_CACHE_SIZE", 100000))
+except ValueError:
+    ENCODED_MAX = 100000
+
+
+def _notify(event: str, obj) -> None:
+    """
+    Forward a storage event to every registered hook.
+
+    Args:
+        event (str): One of "save", "remove" or "clear".
+        obj: The object concerned, or its class for "clear".
+    """
+    if event == "clear":
+        GENERATIONS[obj.__name__] = (GENERATIONS.get(
+            obj.__name__, (0, 0.0))[0] + 1, 0.0)
+        ENCODED.clear()
+    else:
+        ENCODED.pop(obj.id, None)
+        s_class = obj.__class__.__name__
+        generation, changed = GENERATIONS.get(s_class, (0, 0.0))
+        moment = obj.updated_at if event == "save" else datetime.utcnow()
+        GENERATIONS[s_class] = (generation + 1,
+                                max(changed, moment.timestamp()))
+    for hook in HOOKS:
+        hook(event, obj)
+
+
+def _signature(file_path: str) -> tuple:
+    """
+    Identify the current content of a file without reading it.
+
+    Files are always replaced, never rewritten in place, so a new inode
+    (or size or mtime) means another write.
+
+    Returns:
+        tuple: (inode, mtime in ns, size), None if the file is missing.
+    """
+    try:
+        st = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+@contextmanager
+def file_lock(file_path: str):
+    """
+    Hold STORAGE_LOCK and an exclusive lock on "<file_path>.lock", which
+    serializes the writers of a file across processes (pre-fork workers).
+    Reentrant within a thread.
+
+    Args:
+        file_path (str): Path of the file about to be written.
+    """
+    with STORAGE_LOCK:
+        lock_path = file_path + ".lock"
+        entry = _FILE_LOCKS.get(lock_path)
+        if entry is None:
+            fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            entry = _FILE_LOCKS[lock_path] = [fd, 0]
+        entry[1] += 1
+        try:
+            yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _FILE_LOCKS[lock_path]
+                os.close(entry[0])
+
+
+def refresh_all() -> int:
+    """
+    Reload every class whose file another process wrote since this one
+    last read or wrote it (see Base.refresh).
+
+    Returns:
+        int: Number of classes reloaded.
+    """
+    return sum(cls.refresh() for cls, _ in list(FILES.values()))
 
 
 class Base:
@@ -52,18 +150,34 @@ class Base:
             return False
         return self.id == other.id
 
-    def to_json(self, for_serialization: bool = False) -> dict:
+    def to_json(self, for_serialization: bool = False,
+                fields: Iterable[str] = None) -> dict:
         """
         Convert the object to a JSON dictionary.
 
         Args:
             for_serialization (bool): Flag indicating
             if the conversion is for serialization.
+            fields (Iterable[str]): Attributes to convert, all if None.
+            Only these are looked up and formatted, missing ones are
+            skipped.
 
         Returns:
             dict: JSON serializable dictionary of the object's attributes.
         """
         result = {}
+        if fields is not None:
+            attributes = self.__dict__
+            for key in fields:
+                if key not in attributes or \
+                        (not for_serialization and key[0] == '_'):
+                    continue
+                value = attributes[key]
+                if isinstance(value, datetime):
+                    result[key] = value.strftime(TIMESTAMP_FORMAT)
+                else:
+                    result[key] = value
+            return result
         for key, value in self.__dict__.items():
             if not for_serialization and key[0] == '_':
                 continue
@@ -73,53 +187,244 @@ class Base:
                 result[key] = value
         return result
 
+    def to_json_bytes(self, fields: tuple = None) -> bytes:
+        """
+        Encode the object to JSON bytes, as to_json(fields=fields).
+
+        The bytes are kept until the object is saved or removed, for the
+        JSON_CACHE_SIZE (100000 by default, 0 to disable) most recently
+        encoded objects, so repeated list responses skip both to_json and
+        the encoder.
+
+        Args:
+            fields (tuple): Attributes to encode, all if None.
+
+        Returns:
+            bytes: Compact JSON of the object's public attributes.
+        """
+        cached = ENCODED.get(self.id)
+        if cached is not None and cached[0] == fields and \
+                cached[1] == self.updated_at:
+            try:
+                ENCODED.move_to_end(self.id)
+            except KeyError:  # Dropped meanwhile by another thread
+                pass
+            return cached[2]
+        data = dumps(self.to_json(fields=fields))
+        if ENCODED_MAX > 0:
+            ENCODED[self.id] = (fields, self.updated_at, data)
+            try:
+                ENCODED.move_to_end(self.id)
+                while len(ENCODED) > ENCODED_MAX:
+                    ENCODED.popitem(last=False)
+            except KeyError:
+                pass
+        return data
+
     @classmethod
     def load_from_file(cls):
         """
         Load all objects from a file into the in-memory storage.
+
+        The objects are built first and swapped in at once, so readers
+        see either the previous or the new storage.
         """
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
-
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
+        signature = _signature(file_path)
+        objs = {}
+        if signature is not None:
+            with open(file_path, 'r') as f:
+                objs_json = json.load(f)
             for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+                objs[obj_id] = cls(**obj_json)
+            del objs_json
+        with STORAGE_LOCK:
+            DATA[s_class] = objs
+            MAPPED.pop(s_class, None)
+            FILES[s_class] = (cls, signature)
+            _notify("clear", cls)
+            for obj in objs.values():
+                _notify("save", obj)
+
+    @classmethod
+    def load_from_index(cls):
+        """
+        Map the index file of the class instead of loading every object.
+
+        The index is exported from the JSON file first if it is missing
+        or older. Afterwards DATA only holds the objects saved since, as
+        an overlay in front of the shared read-only mapping. Hooks still
+        see every stored object once, as for load_from_file.
+        """
+        from models.mapped_index import MappedIndex, export
+        s_class = cls.__name__
+        file_path = ".db_{}.json".format(s_class)
+        index_path = ".idx_{}.bin".format(s_class)
+        signature = _signature(file_path)
+        if not path.exists(index_path) or (
+                path.exists(file_path) and
+                path.getmtime(file_path) > path.getmtime(index_path)):
+            objs_json = {}
+            if path.exists(file_path):
+                with open(file_path, 'r') as f:
+                    objs_json = json.load(f)
+            export(objs_json.values(), index_path)
+            del objs_json
+        with STORAGE_LOCK:
+            DATA[s_class] = {}
+            MAPPED.pop(s_class, None)
+            _notify("clear", cls)
+            mapped = MappedIndex(cls, index_path)
+            MAPPED[s_class] = mapped
+            FILES[s_class] = (cls, signature)
+            for obj in mapped.values():
+                _notify("save", obj)
+
+    @classmethod
+    def locked(cls):
+        """
+        Lock the file of the class against writers of any process.
+
+        Returns:
+            A context manager, see file_lock.
+        """
+        return file_lock(".db_{}.json".format(cls.__name__))
+
+    @classmethod
+    def refresh(cls) -> bool:
+        """
+        Reload the class storage if another process wrote its file since
+        this one last read or wrote it, so that pre-fork workers see each
+        other's changes. Costs one stat when nothing changed.
+
+        Returns:
+            bool: True if the storage was reloaded.
+        """
+        s_class = cls.__name__
+        known = FILES.get(s_class)
+        file_path = ".db_{}.json".format(s_class)
+        if known is None or _signature(file_path) == known[1]:
+            return False
+        with STORAGE_LOCK:
+            if _signature(file_path) == FILES[s_class][1]:
+                return False
+            if s_class in MAPPED:
+                cls.load_from_index()
+            else:
+                cls.load_from_file()
+        return True
 
     @classmethod
     def save_to_file(cls):
         """
         Save all objects from the in-memory storage to a file.
+
+        The file is written aside and moved in place, under file_lock.
+        Callers changing objects first refresh under the same lock, as
+        save and remove do, so no other process's write is lost.
         """
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
         objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        with file_lock(file_path):
+            mapped = MAPPED.get(s_class)
+            if mapped is not None:
+                for obj_json in mapped.records():
+                    objs_json[obj_json['id']] = obj_json
+            for obj_id, obj in DATA[s_class].items():
+                objs_json[obj_id] = obj.to_json(True)
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+            tmp_path = "{}.{}.tmp".format(file_path, os.getpid())
+            try:
+                with open(tmp_path, 'w') as f:
+                    json.dump(objs_json, f)
+                os.replace(tmp_path, file_path)
+            except BaseException:
+                if path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+            FILES[s_class] = (cls, _signature(file_path))
 
     def save(self):
         """
         Save the current object to the in-memory storage and file.
         """
         s_class = self.__class__.__name__
-        self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        with self.__class__.locked():
+            self.__class__.refresh()
+            self.updated_at = datetime.utcnow()
+            DATA[s_class][self.id] = self
+            if s_class in MAPPED:
+                MAPPED[s_class].shadow(self.id)
+            _notify("save", self)
+            self.__class__.save_to_file()
 
     def remove(self):
         """
         Remove the current object from the in-memory storage and file.
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        with self.__class__.locked():
+            self.__class__.refresh()
+            if self.__class__._discard(self.id):
+                _notify("remove", self)
+                self.__class__.save_to_file()
+
+    @classmethod
+    def _discard(cls, obj_id: str) -> bool:
+        """
+        Drop an ID from the in-memory storage and its mapped index.
+
+        Returns:
+            bool: True if the object was stored.
+        """
+        s_class = cls.__name__
+        with STORAGE_LOCK:
+            found = DATA[s_class].pop(obj_id, None) is not None
+            mapped = MAPPED.get(s_class)
+            if mapped is not None and mapped.shadow(obj_id):
+                found = True
+        return found
+
+    @classmethod
+    def remove_many(cls, objs: Iterable[TypeVar('Base')]) -> int:
+        """
+        Remove several objects from the in-memory storage,
+        writing the file once.
+
+        Args:
+            objs (Iterable[Base]): Objects to remove.
+
+        Returns:
+            int: Number of objects actually removed.
+        """
+        removed = 0
+        with cls.locked():
+            cls.refresh()
+            for obj in objs:
+                if cls._discard(obj.id):
+                    _notify("remove", obj)
+                    removed += 1
+            if removed > 0:
+                cls.save_to_file()
+        return removed
+
+    @classmethod
+    def version(cls) -> str:
+        """
+        Tag the current state of the class storage, for ETags.
+
+        It combines the number of storage events, the number of objects
+        and the time of the last change (the latest updated_at saved or
+        removal), so that it changes with every save, remove or load
+        and processes loading the same file agree on it.
+
+        Returns:
+            str: The tag, in hexadecimal.
+        """
+        generation, changed = GENERATIONS.get(cls.__name__, (0, 0.0))
+        return "{:x}-{:x}-{:x}".format(generation, cls.count(),
+                                       int(changed * 1000000))
 
     @classmethod
     def count(cls) -> int:
@@ -131,7 +436,9 @@ class Base:
             int: Number of objects in the storage.
         """
         s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        mapped = MAPPED.get(s_class)
+        return len(DATA[s_class].keys()) + \
+            (len(mapped) if mapped is not None else 0)
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -143,6 +450,24 @@ class Base:
         """
         return cls.search()
 
+    @classmethod
+    def iterate(cls) -> Iterator[TypeVar('Base')]:
+        """
+        Yield all objects of the class type one at a time.
+
+        Unlike all(), objects of a mapped index are decoded as they are
+        reached, and in-memory ones are taken from a copy of the
+        references, so saves during the iteration are harmless.
+
+        Returns:
+            Iterator[Base]: All objects.
+        """
+        s_class = cls.__name__
+        yield from list(DATA[s_class].values())
+        mapped = MAPPED.get(s_class)
+        if mapped is not None:
+            yield from mapped.values()
+
     @classmethod
     def get(cls, id: str) -> TypeVar('Base'):
         """
@@ -155,7 +480,10 @@ class Base:
             Base: The object with the given ID, or None if not found.
         """
         s_class = cls.__name__
-        return DATA[s_class].get(id)
+        obj = DATA[s_class].get(id)
+        if obj is None and s_class in MAPPED:
+            return MAPPED[s_class].get(id)
+        return obj
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
@@ -169,6 +497,11 @@ class Base:
             List[Base]: List of matching objects.
         """
         s_class = cls.__name__
+        columns = COLUMNS.get(s_class)
+        if columns is not None and len(attributes) > 0 \
+                and columns.covers(attributes):
+            return [cls.get(obj_id)
+                    for obj_id in columns.ids_equal(attributes)]
 
         def _search(obj):
             """
@@ -187,4 +520,13 @@ class Base:
                 if getattr(obj, k) != v:
                     return False
             return True
-        return list(filter(_search, DATA[s_class].values()))
+        result = list(filter(_search, list(DATA[s_class].values())))
+        mapped = MAPPED.get(s_class)
+        if mapped is not None:
+            if len(attributes) == 1 and \
+                    next(iter(attributes)) in mapped.keys:
+                key, value = next(iter(attributes.items()))
+                result.extend(mapped.find(key, value))
+            else:
+                result.extend(filter(_search, mapped.values()))
+        return result
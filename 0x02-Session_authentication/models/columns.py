@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+""" Columnar mirror of model attributes
+"""
+from array import array
+from datetime import datetime
+from typing import Iterable, List, TypeVar
+from models.base import COLUMNS, DATA, HOOKS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EPOCH = datetime(1970, 1, 1)  # Naive reference for datetime columns
+REMOVED = -2  # String code of a removed row, matching no value
+COMPACT_MIN = 1024  # Tombstones or stale values tolerated before compacting
+
+
+def _to_seconds(value: datetime) -> float:
+    """ Convert a naive datetime to seconds since EPOCH, NaN for None
+    """
+    if value is None:
+        return float('nan')
+    return (value - EPOCH).total_seconds()
+
+
+class ColumnStore:
+    """ Keeps selected attributes of a model class in flat arrays
+
+    String attributes are interned: every distinct value (None included)
+    gets an integer code, and the column stores codes in an array('q').
+    Datetime attributes are stored as seconds in an array('d').
+    Scans run over the arrays (with NumPy when it is installed) and
+    never touch the model objects.
+    Rows stay in insertion order, the order of a scan of the storage:
+    a removed row is left as a tombstone matching nothing, and the
+    tombstones and the values no row uses anymore are dropped by a
+    compaction once they outnumber the live ones.
+    """
+
+    def __init__(self, strings: Iterable[str] = (),
+                 times: Iterable[str] = ()):
+        """ Initialize an empty store for the given attributes
+        """
+        self._strings = {attr: array('q') for attr in strings}
+        self._times = {attr: array('d') for attr in times}
+        self.clear()
+
+    def __len__(self) -> int:
+        """ Number of mirrored rows
+        """
+        return len(self._rows)
+
+    def _intern(self, value) -> int:
+        """ Return the code of a value, allocating one if needed
+        """
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self._values)
+            self._codes[value] = code
+            self._values.append(value)
+        return code
+
+    def add(self, obj: TypeVar('Base')):
+        """ Insert or refresh the row of an object
+        """
+        row = self._rows.get(obj.id)
+        if row is None:
+            row = len(self._ids)
+            self._rows[obj.id] = row
+            self._ids.append(obj.id)
+            for attr, col in self._strings.items():
+                col.append(self._intern(getattr(obj, attr, None)))
+            for attr, col in self._times.items():
+                col.append(_to_seconds(getattr(obj, attr, None)))
+            return
+        for attr, col in self._strings.items():
+            col[row] = self._intern(getattr(obj, attr, None))
+        for attr, col in self._times.items():
+            col[row] = _to_seconds(getattr(obj, attr, None))
+        if len(self._values) > COMPACT_MIN + \
+                2 * len(self._strings) * len(self._rows):
+            self._compact()
+
+    def discard(self, obj_id: str):
+        """ Remove the row of an object id, leaving a tombstone
+        """
+        row = self._rows.pop(obj_id, None)
+        if row is None:
+            return
+        self._ids[row] = None
+        for col in self._strings.values():
+            col[row] = REMOVED
+        for col in self._times.values():
+            col[row] = float('inf')
+        if len(self._ids) - len(self._rows) > \
+                max(COMPACT_MIN, len(self._rows)):
+            self._compact()
+
+    def _compact(self):
+        """ Drop the tombstones and the interned values no row uses
+        anymore, keeping the rows in order
+        """
+        live = [row for row, obj_id in enumerate(self._ids)
+                if obj_id is not None]
+        values = self._values
+        self._ids = [self._ids[row] for row in live]
+        self._rows = {obj_id: row for row, obj_id in enumerate(self._ids)}
+        self._codes = {}
+        self._values = []
+        for attr, col in self._strings.items():
+            self._strings[attr] = array('q', (self._intern(values[col[row]])
+                                              for row in live))
+        for attr, col in self._times.items():
+            self._times[attr] = array('d', (col[row] for row in live))
+
+    def clear(self):
+        """ Drop every row and every interned value
+        """
+        self._ids = []  # Row -> object id, None for a tombstone
+        self._rows = {}
+        self._codes = {}
+        self._values = []
+        for attr in self._strings:
+            self._strings[attr] = array('q')
+        for attr in self._times:
+            self._times[attr] = array('d')
+
+    def covers(self, attributes: dict) -> bool:
+        """ True if every searched attribute is mirrored
+        """
+        for attr in attributes:
+            if attr not in self._strings and attr not in self._times:
+                return False
+        return True
+
+    def _mask_equal(self, attributes: dict):
+        """ Rows matching every attribute, as a NumPy mask or index list
+        """
+        rows = None
+        for attr, value in attributes.items():
+            if attr in self._strings:
+                col = self._strings[attr]
+                try:
+                    target = self._codes.get(value, -1)
+                except TypeError:
+                    target = -1
+            else:
+                col = self._times[attr]
+                if not isinstance(value, datetime) and value is not None:
+                    target = float('nan')
+                else:
+                    target = _to_seconds(value)
+            if np is not None:
+                view = np.frombuffer(col, dtype=np.float64
+                                     if col.typecode == 'd' else np.int64)
+                if target != target:
+                    mask = np.isnan(view)
+                else:
+                    mask = view == target
+                del view
+                rows = mask if rows is None else rows & mask
+            else:
+                if target != target:
+                    match = [i for i, v in enumerate(col) if v != v]
+                else:
+                    match = [i for i, v in enumerate(col) if v == target]
+                rows = match if rows is None else \
+                    sorted(set(rows).intersection(match))
+        return rows
+
+    def _mask_before(self, attr: str, moment: datetime):
+        """ Rows whose datetime attribute is strictly before moment
+        """
+        col = self._times[attr]
+        limit = _to_seconds(moment)
+        if np is not None:
+            view = np.frombuffer(col, dtype=np.float64)
+            mask = view < limit
+            del view
+            return mask
+        return [i for i, v in enumerate(col) if v < limit]
+
+    def _ids_of(self, rows) -> List[str]:
+        """ Map a mask or index list back to object ids
+        """
+        if np is not None and not isinstance(rows, list):
+            rows = np.flatnonzero(rows).tolist()
+        ids = self._ids
+        return [ids[i] for i in rows]
+
+    @staticmethod
+    def _count_of(rows) -> int:
+        """ Number of rows selected by a mask or index list
+        """
+        if np is not None and not isinstance(rows, list):
+            return int(np.count_nonzero(rows))
+        return len(rows)
+
+    def ids_equal(self, attributes: dict) -> List[str]:
+        """ Ids of the objects whose attributes equal the given values
+        """
+        return self._ids_of(self._mask_equal(attributes))
+
+    def count_equal(self, attributes: dict) -> int:
+        """ Number of objects whose attributes equal the given values
+        """
+        return self._count_of(self._mask_equal(attributes))
+
+    def ids_before(self, attr: str, moment: datetime) -> List[str]:
+        """ Ids of the objects whose datetime attribute is before moment
+        """
+        return self._ids_of(self._mask_before(attr, moment))
+
+    def count_before(self, attr: str, moment: datetime) -> int:
+        """ Number of objects whose datetime attribute is before moment
+        """
+        return self._count_of(self._mask_before(attr, moment))
+
+
+def mirror(cls, strings: Iterable[str] = (),
+           times: Iterable[str] = ('created_at', 'updated_at')) -> ColumnStore:
+    """ Start mirroring a model class into a ColumnStore
+
+    The store is filled from the objects already in memory, kept in sync
+    by Base.save/remove/load_from_file and used by Base.search whenever
+    every searched attribute is mirrored.
+    """
+    s_class = cls.__name__
+    store = ColumnStore(strings, times)
+    for obj in DATA.get(s_class, {}).values():
+        store.add(obj)
+
+    def hook(event, obj):
+        """ Keep the store in sync with the in-memory storage
+        """
+        if event == "clear":
+            if obj.__name__ == s_class:
+                store.clear()
+        elif obj.__class__.__name__ == s_class:
+            if event == "save":
+                store.add(obj)
+            elif event == "remove":
+                store.discard(obj.id)
+
+    COLUMNS[s_class] = store
+    HOOKS.append(hook)
+    return store
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+""" JSON encoding to bytes with the fastest encoder installed.
+Keys are sorted whatever the encoder, as Flask's jsonify does by default.
+"""
+import json
+from os import getenv
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+_STDLIB = json.JSONEncoder(separators=(',', ':'), sort_keys=True)  # Reused
+
+
+def _stdlib_dumps(obj) -> bytes:
+    """ Encode obj with the standard library
+    """
+    return _STDLIB.encode(obj).encode('utf-8')
+
+
+def _ujson_dumps(obj) -> bytes:
+    """ Encode obj with ujson
+    """
+    return ujson.dumps(obj, sort_keys=True).encode('utf-8')
+
+
+def _orjson_dumps(obj) -> bytes:
+    """ Encode obj with orjson
+    """
+    return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+
+
+_ENCODERS = {"json": _stdlib_dumps}
+if ujson is not None:
+    _ENCODERS["ujson"] = _ujson_dumps
+if orjson is not None:
+    _ENCODERS["orjson"] = _orjson_dumps
+
+# JSON_ENCODER forces one of the installed encoders, else the fastest wins
+ENCODER = getenv("JSON_ENCODER", "")
+if ENCODER not in _ENCODERS:
+    ENCODER = "orjson" if orjson else "ujson" if ujson else "json"
+dumps = _ENCODERS[ENCODER]  # dumps(obj) -> bytes, compact, sorted keys
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+""" Memory-mapped read-only index of stored objects
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+from typing import Iterable, Iterator, List
+
+MAGIC = b"MIDX0001"
+_HEADER = struct.Struct("<8sI")  # magic, length of the JSON meta block
+_SLOT = struct.Struct("<QQ")  # key hash, record offset (0 = empty slot)
+_LENGTH = struct.Struct("<I")  # length prefix of a record
+
+
+def _hash(value) -> int:
+    """
+    Returns the 64-bit hash of a key, stable across processes
+    (unlike hash(), which is salted per interpreter).
+    """
+    if isinstance(value, str):
+        data = value.encode('utf-8')
+    else:
+        data = json.dumps(value).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(),
+                          'little')
+
+
+def export(records: Iterable[dict], file_path: str,
+           keys: tuple = ('id', 'email')) -> int:
+    """
+    Write records to an index file.
+
+    The file holds a header, one open-addressing hash table of fixed-width
+    slots per key, then the records as length-prefixed JSON. Tables have
+    a power-of-two number of slots, at least twice the record count.
+    The file is written aside and moved in place atomically.
+
+    Args:
+        records (Iterable[dict]): Serialized objects (to_json(True)).
+        file_path (str): Path of the index file.
+        keys (tuple): Attributes to index.
+
+    Returns:
+        int: Number of records written.
+    """
+    blobs = []
+    hashes = {key: [] for key in keys}
+    for record in records:
+        blobs.append(json.dumps(record, separators=(',', ':'))
+                     .encode('utf-8'))
+        for key in keys:
+            hashes[key].append(_hash(record.get(key)))
+    slots = 1
+    while slots < 2 * len(blobs):
+        slots *= 2
+    meta = {"count": len(blobs), "slots": slots, "keys": list(keys)}
+    meta_json = json.dumps(meta).encode('utf-8')
+    tables_start = _HEADER.size + len(meta_json)
+    records_start = tables_start + len(keys) * slots * _SLOT.size
+    offsets = []
+    offset = records_start
+    for blob in blobs:
+        offsets.append(offset)
+        offset += _LENGTH.size + len(blob)
+    tmp_path = "{}.{}.tmp".format(file_path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, len(meta_json)))
+        f.write(meta_json)
+        mask = slots - 1
+        for key in keys:
+            table = bytearray(slots * _SLOT.size)
+            for key_hash, record_offset in zip(hashes[key], offsets):
+                i = key_hash & mask
+                while _SLOT.unpack_from(table, i * _SLOT.size)[1]:
+                    i = (i + 1) & mask
+                _SLOT.pack_into(table, i * _SLOT.size, key_hash,
+                                record_offset)
+            f.write(table)
+        for blob in blobs:
+            f.write(_LENGTH.pack(len(blob)))
+            f.write(blob)
+    os.replace(tmp_path, file_path)
+    return len(blobs)
+
+
+class MappedIndex:
+    """
+    Read-only view of an index file written by export.
+
+    The file is mapped with mmap, so every process opening it shares the
+    same page-cache pages instead of holding its own copy of the objects.
+    Lookups by an indexed key probe the hash table and decode only the
+    matching records. Objects saved or removed since the export live in
+    DATA, the in-memory overlay: their IDs are shadowed here, and Base
+    reads the overlay first.
+    """
+
+    def __init__(self, cls, file_path: str):
+        """
+        Map an index file.
+
+        Args:
+            cls: Model class of the records.
+            file_path (str): Path of the index file.
+        """
+        self.cls = cls
+        self.file_path = file_path
+        with open(file_path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, meta_length = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError("{} is not an index file".format(file_path))
+        meta = json.loads(self._map[_HEADER.size:
+                                    _HEADER.size + meta_length])
+        self.count = meta["count"]
+        self.slots = meta["slots"]
+        self.keys = tuple(meta["keys"])
+        tables_start = _HEADER.size + meta_length
+        table_size = self.slots * _SLOT.size
+        self._tables = {key: tables_start + n * table_size
+                        for n, key in enumerate(self.keys)}
+        self._records_start = tables_start + len(self.keys) * table_size
+        self._shadowed = set()
+
+    def _record(self, offset: int) -> dict:
+        """
+        Decode the record stored at offset.
+        """
+        length, = _LENGTH.unpack_from(self._map, offset)
+        start = offset + _LENGTH.size
+        return json.loads(self._map[start:start + length])
+
+    def _find(self, key: str, value) -> Iterator[dict]:
+        """
+        Yield the records whose key equals value, shadowed ones included.
+        """
+        table = self._tables[key]
+        mask = self.slots - 1
+        key_hash = _hash(value)
+        i = key_hash & mask
+        while True:
+            slot_hash, offset = _SLOT.unpack_from(
+                self._map, table + i * _SLOT.size)
+            if offset == 0:
+                return
+            if slot_hash == key_hash:
+                record = self._record(offset)
+                if record.get(key) == value:
+                    yield record
+            i = (i + 1) & mask
+
+    def contains(self, obj_id: str) -> bool:
+        """
+        Check whether an ID is live in the file (not shadowed).
+        """
+        if obj_id in self._shadowed:
+            return False
+        return next(self._find('id', obj_id), None) is not None
+
+    def get(self, obj_id: str):
+        """
+        Return the object of an ID, or None if absent or shadowed.
+        """
+        if obj_id in self._shadowed:
+            return None
+        record = next(self._find('id', obj_id), None)
+        return None if record is None else self.cls(**record)
+
+    def find(self, key: str, value) -> List:
+        """
+        Return the live objects whose indexed key equals value.
+        """
+        return [self.cls(**record) for record in self._find(key, value)
+                if record.get('id') not in self._shadowed]
+
+    def shadow(self, obj_id: str) -> bool:
+        """
+        Hide an ID, now saved in or removed from the overlay.
+
+        Returns:
+            bool: True if the ID was live in the file.
+        """
+        if not self.contains(obj_id):
+            return False
+        self._shadowed.add(obj_id)
+        return True
+
+    def records(self) -> Iterator[dict]:
+        """
+        Yield the live records in file order.
+        """
+        offset = self._records_start
+        for _ in range(self.count):
+            length, = _LENGTH.unpack_from(self._map, offset)
+            start = offset + _LENGTH.size
+            offset = start + length
+            record = json.loads(self._map[start:offset])
+            if record.get('id') not in self._shadowed:
+                yield record
+
+    def values(self) -> Iterator:
+        """
+        Yield the live objects in file order.
+        """
+        for record in self.records():
+            yield self.cls(**record)
+
+    def __len__(self) -> int:
+        """
+        Number of live records.
+        """
+        return self.count - len(self._shadowed)
+
+    def close(self):
+        """
+        Unmap the file.
+        """
+        self._map.close()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+""" Prefix and substring index over model text attributes
+"""
+from bisect import bisect_left, insort
+from threading import RLock
+from typing import Iterable, List
+from models.base import DATA, HOOKS
+
+GRAM = 3  # Length of the n-grams used for substring search
+
+
+def _grams(value: str) -> set:
+    """ Set of the GRAM-long substrings of a value
+    """
+    return {value[i:i + GRAM] for i in range(len(value) - GRAM + 1)}
+
+
+class TextIndex:
+    """ Case-insensitive text index
+
+    Every attribute of `prefix` is kept in a sorted list of
+    (value, id) pairs, so prefix lookups are a bisect followed by a walk
+    over the matches. After a clear (e.g. a reload from file) the lists
+    are appended to unsorted and sorted once on their next use.
+    Lookups hold the lock that serializes the updates, as they walk the
+    lists and sets that updates change in place.
+    Every attribute of `contains` is also split into trigrams mapped to
+    the ids containing them; a substring lookup scans the smallest
+    posting set and checks the candidates.
+    """
+
+    def __init__(self, prefix: Iterable[str] = (),
+                 contains: Iterable[str] = ()):
+        """ Initialize an empty index for the given attributes
+        """
+        self._prefix = tuple(prefix)
+        self._contains = tuple(contains)
+        self._lock = RLock()
+        self.clear()
+
+    def clear(self):
+        """ Drop every entry
+        """
+        with self._lock:
+            self._values = {}
+            self._sorted = {attr: [] for attr in self._prefix}
+            self._unsorted = set(self._prefix)
+            self._postings = {}
+
+    def _values_of(self, attr: str) -> list:
+        """ Sorted (value, id) list of a prefix attribute, lock held
+        """
+        values = self._sorted[attr]
+        if attr in self._unsorted:
+            values.sort()
+            self._unsorted.discard(attr)
+        return values
+
+    def _entries(self, obj) -> dict:
+        """ Lowercased indexed values of an object
+        """
+        entries = {}
+        for attr in set(self._prefix + self._contains):
+            value = getattr(obj, attr, None)
+            if isinstance(value, str):
+                entries[attr] = value.lower()
+        return entries
+
+    def add(self, obj):
+        """ Insert or refresh the entries of an object
+        """
+        entries = self._entries(obj)
+        with self._lock:
+            self._add(obj.id, entries)
+
+    def _add(self, obj_id: str, entries: dict):
+        """ Insert or refresh the entries of an object id, lock held
+        """
+        if self._values.get(obj_id) == entries:
+            return
+        self._discard(obj_id)
+        self._values[obj_id] = entries
+        for attr in self._prefix:
+            if attr not in entries:
+                continue
+            if attr in self._unsorted:
+                self._sorted[attr].append((entries[attr], obj_id))
+            else:
+                insort(self._sorted[attr], (entries[attr], obj_id))
+        for attr in self._contains:
+            if attr in entries:
+                for gram in _grams(entries[attr]):
+                    self._postings.setdefault(gram, set()).add(obj_id)
+
+    def discard(self, obj_id: str):
+        """ Remove the entries of an object id
+        """
+        with self._lock:
+            self._discard(obj_id)
+
+    def _discard(self, obj_id: str):
+        """ Remove the entries of an object id, lock held
+        """
+        entries = self._values.pop(obj_id, None)
+        if entries is None:
+            return
+        for attr in self._prefix:
+            if attr in entries:
+                values = self._values_of(attr)
+                i = bisect_left(values, (entries[attr], obj_id))
+                if i < len(values) and values[i][1] == obj_id:
+                    del values[i]
+        grams = set()
+        for attr in self._contains:
+            if attr in entries:
+                grams |= _grams(entries[attr])
+        for gram in grams:
+            ids = self._postings.get(gram)
+            if ids is not None:
+                ids.discard(obj_id)
+                if not ids:
+                    del self._postings[gram]
+
+    def starts_with(self, attr: str, query: str, limit: int) -> List[str]:
+        """ Ids whose attribute starts with query, at most limit of them
+        """
+        query = query.lower()
+        found = []
+        with self._lock:
+            values = self._values_of(attr)
+            i = bisect_left(values, (query,))
+            while i < len(values) and len(found) < limit:
+                value, obj_id = values[i]
+                if not value.startswith(query):
+                    break
+                found.append(obj_id)
+                i += 1
+        return found
+
+    def contains(self, query: str, limit: int) -> List[str]:
+        """ Ids whose `contains` attributes hold query, at most limit
+
+        Queries shorter than a trigram fall back to prefix matching on
+        the `contains` attributes that are also prefix-indexed.
+        """
+        with self._lock:
+            return self._contains_locked(query.lower(), limit)
+
+    def _contains_locked(self, query: str, limit: int) -> List[str]:
+        """ Ids whose `contains` attributes hold query, lock held
+        """
+        found = []
+        if len(query) < GRAM:
+            for attr in self._contains:
+                if attr not in self._sorted:
+                    continue
+                for obj_id in self.starts_with(attr, query, limit):
+                    if obj_id not in found:
+                        found.append(obj_id)
+                        if len(found) >= limit:
+                            return found
+            return found
+        postings = []
+        for gram in _grams(query):
+            ids = self._postings.get(gram)
+            if ids is None:
+                return found
+            postings.append(ids)
+        postings.sort(key=len)
+        smallest, others = postings[0], postings[1:]
+        for obj_id in smallest:
+            if any(obj_id not in ids for ids in others):
+                continue
+            entries = self._values[obj_id]
+            for attr in self._contains:
+                if query in entries.get(attr, ''):
+                    found.append(obj_id)
+                    break
+            if len(found) >= limit:
+                break
+        return found
+
+
+def index(cls, prefix: Iterable[str] = (),
+          contains: Iterable[str] = ()) -> TextIndex:
+    """ Build a TextIndex for a model class and keep it in sync
+
+    The index is updated by Base.save/remove/load_from_file.
+    """
+    s_class = cls.__name__
+    text_index = TextIndex(prefix, contains)
+    for obj in DATA.get(s_class, {}).values():
+        text_index.add(obj)
+
+    def hook(event, obj):
+        """ Keep the index in sync with the in-memory storage
+        """
+        if event == "clear":
+            if obj.__name__ == s_class:
+                text_index.clear()
+        elif obj.__class__.__name__ == s_class:
+            if event == "save":
+                text_index.add(obj)
+            elif event == "remove":
+                text_index.discard(obj.id)
+
+    HOOKS.append(hook)
+    return text_index
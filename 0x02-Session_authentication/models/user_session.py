@@ -2,7 +2,15 @@
 """
 This is a userSession module
 """
-from models.base import Base
+import heapq
+from datetime import datetime
+from typing import List, TypeVar
+from models.base import Base, DATA, HOOKS, STORAGE_LOCK, TIMESTAMP_FORMAT
+
+SESSIONS = {}  # session_id -> UserSession, maintained by _index_hook
+_BY_USER = {}  # user_id -> set of UserSession ids
+_INDEXED = {}  # UserSession id -> (session_id, user_id) it is indexed under
+_BY_SEEN = []  # Heap of (seen_at, UserSession id)
 
 
 class UserSession(Base):
@@ -17,3 +25,88 @@ class UserSession(Base):
         super().__init__(*args, **kwargs)
         self.user_id = kwargs.get('user_id')
         self.session_id = kwargs.get('session_id')
+        self.last_seen = (
+            datetime.strptime(kwargs.get('last_seen'), TIMESTAMP_FORMAT)
+            if kwargs.get('last_seen') else None
+        )
+
+    @property
+    def seen_at(self) -> datetime:
+        """
+        Last time the session was refreshed, or its creation time
+        """
+        return self.last_seen if self.last_seen is not None \
+            else self.created_at
+
+    @classmethod
+    def get_by_session_id(cls, session_id: str) -> TypeVar('UserSession'):
+        """
+        Retrieve one UserSession by its session ID in O(1)
+        """
+        return SESSIONS.get(session_id)
+
+    @classmethod
+    def get_by_user_id(cls, user_id: str) -> List[TypeVar('UserSession')]:
+        """
+        Retrieve the UserSessions of a user in O(sessions of that user)
+        """
+        sessions = DATA.get(cls.__name__, {})
+        return [sessions[obj_id] for obj_id in _BY_USER.get(user_id, ())
+                if obj_id in sessions]
+
+    @classmethod
+    def pop_seen_before(cls, moment: datetime
+                        ) -> List[TypeVar('UserSession')]:
+        """
+        Take the UserSessions last seen before moment out of the
+        time-ordered index, oldest first, in O(k log n) for k results.
+        Sessions refreshed since they were indexed are re-indexed under
+        their new seen_at instead. The caller is expected to remove the
+        sessions returned.
+        """
+        found = []
+        sessions = DATA.get(cls.__name__, {})
+        with STORAGE_LOCK:
+            while _BY_SEEN and _BY_SEEN[0][0] < moment:
+                seen_at, obj_id = heapq.heappop(_BY_SEEN)
+                obj = sessions.get(obj_id)
+                if obj is None:
+                    continue
+                if obj.seen_at == seen_at:
+                    found.append(obj)
+                elif obj.seen_at > seen_at:
+                    heapq.heappush(_BY_SEEN, (obj.seen_at, obj_id))
+        return found
+
+
+def _index_hook(event: str, obj):
+    """
+    Keep SESSIONS, _BY_USER and _BY_SEEN in sync with the in-memory
+    storage
+    """
+    if event == "clear":
+        if obj is UserSession:
+            SESSIONS.clear()
+            _BY_USER.clear()
+            _INDEXED.clear()
+            _BY_SEEN.clear()
+    elif isinstance(obj, UserSession):
+        previous = _INDEXED.pop(obj.id, None)
+        if previous is not None:
+            session_id, user_id = previous
+            if SESSIONS.get(session_id) is obj:
+                del SESSIONS[session_id]
+            ids = _BY_USER.get(user_id)
+            if ids is not None:
+                ids.discard(obj.id)
+                if not ids:
+                    del _BY_USER[user_id]
+        if event == "save":
+            SESSIONS[obj.session_id] = obj
+            _BY_USER.setdefault(obj.user_id, set()).add(obj.id)
+            if previous is None:
+                heapq.heappush(_BY_SEEN, (obj.seen_at, obj.id))
+            _INDEXED[obj.id] = (obj.session_id, obj.user_id)
+
+
+HOOKS.append(_index_hook)
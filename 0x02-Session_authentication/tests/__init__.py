@@ -0,0 +1,4 @@
+#!/usr/bin/env python3
+""" Tests of the API, run from this project directory with
+    python3 -m pytest tests
+"""
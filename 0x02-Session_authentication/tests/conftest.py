@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+""" Fixtures of the API tests: applications built by create_app in an
+empty working directory, where the .db_*.json files are written
+"""
+import pytest
+from api.v1.app import create_app
+from models.user import User
+
+SESSION_NAME = "_my_session_id"
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """ Returns a function building an application with session_auth
+    and the given environment variables, its data already loaded
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("AUTH_TYPE", "session_auth")
+    monkeypatch.setenv("SESSION_NAME", SESSION_NAME)
+
+    def make(**env):
+        """ Builds the application
+        """
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        return create_app(preload=True)
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    """ Application with session_auth
+    """
+    return make_app()
+
+
+def add_user(email: str, password: str = "pwd", **attributes) -> User:
+    """ Stores a user
+    """
+    user = User(email=email, **attributes)
+    user.password = password
+    user.save()
+    return user
+
+
+def login(client, email: str, password: str = "pwd", **kwargs):
+    """ Logs a test client in
+    Return:
+        response of the login route
+    """
+    return client.post("/api/v1/auth_session/login",
+                       data={"email": email, "password": password}, **kwargs)
+
+
+@pytest.fixture
+def client(app):
+    """ Test client logged in as bob@hbtn.io, among a few users
+    """
+    add_user("bob@hbtn.io", first_name="Bob", last_name="Dylan")
+    add_user("alice@hbtn.io", first_name="Alice", last_name="Cooper")
+    add_user("bobby@hbtn.io", first_name="Robert", last_name="Smith")
+    client = app.test_client()
+    assert login(client, "bob@hbtn.io").status_code == 200
+    return client
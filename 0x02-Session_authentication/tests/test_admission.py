@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+""" Tests of the admission control 503
+"""
+import threading
+import time
+import urllib.error
+import urllib.request
+from api.v1.prefork import PreforkServer
+from tests.conftest import add_user, login
+
+
+def test_queued_too_long(make_app):
+    """ a request that queued beyond the target behind a trusted proxy
+    is shed with 503 and Retry-After; from elsewhere, its header is
+    ignored
+    """
+    app = make_app(ADMISSION_TRUSTED_PROXIES="127.0.0.1")
+    add_user("bob@hbtn.io")
+    client = app.test_client()
+    assert login(client, "bob@hbtn.io").status_code == 200
+    old = {"X-Request-Start": "t={}".format(int((time.time() - 5) * 1000))}
+    response = client.get("/api/v1/users", headers=old)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    response = client.get("/api/v1/users", headers=old,
+                          environ_base={"REMOTE_ADDR": "10.0.44.1"})
+    assert response.status_code == 200
+    assert app.extensions['admission'].limits['users'].shed == 1
+
+
+def test_limit_reached(app, client):
+    """ beyond the concurrency limit of a route class, requests get 503
+    until a slot is given back
+    """
+    users = app.extensions['admission'].limits['users']
+    users.limit = 1
+    export = client.get("/api/v1/users/export", buffered=False)
+    assert export.status_code == 200
+    assert users.inflight == 1
+    response = client.get("/api/v1/users")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert client.get("/api/v1/status").status_code == 200
+    export.close()
+    assert users.inflight == 0
+    assert client.get("/api/v1/users").status_code == 200
+
+
+def test_concurrent_requests(app):
+    """ a threaded pre-fork worker runs requests concurrently, so those
+    beyond the limit of their class are shed
+    """
+    admission = app.extensions['admission']
+    admission.limits['users'].limit = 2
+    inner = admission.app
+
+    def slow(environ, start_response):
+        """ Application taking a while to answer
+        """
+        time.sleep(0.5)
+        return inner(environ, start_response)
+
+    admission.app = slow
+    server = PreforkServer(app, "127.0.0.1", 0, 1)
+    server._listen()
+    worker = server._make_server()
+    thread = threading.Thread(target=worker.serve_forever)
+    thread.start()
+    url = "http://127.0.0.1:{}/api/v1/users".format(worker.server_port)
+    statuses = []
+
+    def get():
+        """ Requests the users
+        """
+        try:
+            statuses.append(urllib.request.urlopen(url).status)
+        except urllib.error.HTTPError as e:
+            statuses.append(e.code)
+
+    try:
+        clients = [threading.Thread(target=get) for _ in range(6)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+    finally:
+        worker.shutdown()
+        thread.join()
+        server._socket.close()
+    assert statuses.count(503) == 4
+    assert statuses.count(401) == 2
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+""" Tests of the conditional GETs and compression of the users routes
+"""
+import gzip
+import json
+from tests.conftest import add_user
+
+
+def test_users_not_modified(client):
+    """ /users answers 304 to its own ETag until a user changes
+    """
+    response = client.get("/api/v1/users")
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"')
+    assert "Accept-Encoding" in response.headers["Vary"]
+    response = client.get("/api/v1/users", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert response.headers["ETag"] == etag
+    add_user("carol@hbtn.io")
+    response = client.get("/api/v1/users", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert len(response.json) == 4
+
+
+def test_user_not_modified(client):
+    """ /users/<id> answers 304 to its own ETag until the user is saved
+    """
+    etag = client.get("/api/v1/users/me").headers["ETag"]
+    headers = {"If-None-Match": etag}
+    assert client.get("/api/v1/users/me", headers=headers).status_code == 304
+    user_id = client.get("/api/v1/users/me").json["id"]
+    assert client.put("/api/v1/users/" + user_id,
+                      json={"first_name": "Robert"}).status_code == 200
+    response = client.get("/api/v1/users/me", headers=headers)
+    assert response.status_code == 200
+    assert response.json["first_name"] == "Robert"
+    assert response.headers["ETag"] != etag
+
+
+def test_compressed(client):
+    """ large bodies are gzipped for the clients accepting it
+    """
+    for i in range(30):
+        add_user("user{}@hbtn.io".format(i))
+    plain = client.get("/api/v1/users")
+    assert "Content-Encoding" not in plain.headers
+    response = client.get("/api/v1/users",
+                          headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert len(response.data) < len(plain.data)
+    assert json.loads(gzip.decompress(response.data)) == plain.json
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+""" Tests of /users/export
+"""
+import json
+from api.v1.views import users
+from tests.conftest import add_user
+
+
+def lines(response) -> list:
+    """ Returns the JSON objects of an NDJSON body
+    """
+    return [json.loads(line) for line in response.data.splitlines()]
+
+
+def test_export(client):
+    """ every user is exported, one JSON object per line
+    """
+    response = client.get("/api/v1/users/export")
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert response.data.endswith(b"\n")
+    exported = lines(response)
+    assert sorted(user["email"] for user in exported) == \
+        ["alice@hbtn.io", "bob@hbtn.io", "bobby@hbtn.io"]
+    by_id = {user["id"]: user for user in client.get("/api/v1/users").json}
+    assert {user["id"]: user for user in exported} == by_id
+
+
+def test_export_chunks(client, monkeypatch):
+    """ users spanning several chunks are all exported once
+    """
+    monkeypatch.setattr(users, "EXPORT_CHUNK", 2)
+    for i in range(4):
+        add_user("user{}@hbtn.io".format(i))
+    response = client.get("/api/v1/users/export", buffered=False)
+    chunks = list(response.response)
+    response.close()
+    assert len(chunks) == 4
+    emails = [json.loads(line)["email"]
+              for line in b"".join(chunks).splitlines()]
+    assert len(emails) == 7 == len(set(emails))
+
+
+def test_export_fields(client):
+    """ fields restricts the exported attributes
+    """
+    exported = lines(client.get("/api/v1/users/export?fields=id,email"))
+    assert len(exported) == 3
+    assert all(set(user) == {"id", "email"} for user in exported)
+
+
+def test_export_requires_auth(app):
+    """ the export is for authenticated users only
+    """
+    assert app.test_client().get("/api/v1/users/export").status_code == 401
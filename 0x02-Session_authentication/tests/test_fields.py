@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+""" Tests of the fields query parameter of the users routes
+"""
+
+
+def test_list_fields(client):
+    """ fields restricts the attributes of /users, in any order and
+    without duplicates
+    """
+    users = client.get("/api/v1/users?fields=email, first_name,email").json
+    assert len(users) == 3
+    assert all(list(user) == ["email", "first_name"] for user in users)
+    assert {user["first_name"] for user in users} == \
+        {"Alice", "Bob", "Robert"}
+
+
+def test_one_fields(client):
+    """ fields restricts the attributes of /users/<id>
+    """
+    assert client.get("/api/v1/users/me?fields=last_name").json == \
+        {"last_name": "Dylan"}
+    user = client.get("/api/v1/users/me").json
+    assert {"id", "email", "first_name", "last_name", "created_at",
+            "updated_at"} <= set(user)
+    assert client.get("/api/v1/users/{}?fields=id".format(user["id"])) \
+        .json == {"id": user["id"]}
+
+
+def test_hidden_fields(client):
+    """ private and unknown attributes are never returned
+    """
+    assert client.get("/api/v1/users/me?fields=_password,unknown").json == {}
+    assert "_password" not in client.get("/api/v1/users/me").json
+
+
+def test_search_fields(client):
+    """ fields restricts the attributes of /users/search
+    """
+    assert client.get("/api/v1/users/search?q=alice&fields=email").json == \
+        [{"email": "alice@hbtn.io"}]
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+""" Import-time budget of api.v1.app: the stored data is loaded after the
+import (by create_app), and the auth modules on demand
+"""
+import json
+import os
+import subprocess
+import sys
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USERS = 50000  # Stored users, about 3s to load if imported eagerly
+BUDGET = 0.5  # Seconds of import time of the api and models modules
+LAZY = ("api.v1.auth.session_auth", "api.v1.auth.session_db_auth",
+        "api.v1.auth.signed_session_auth", "api.v1.auth.basic_auth",
+        "api.v1.auth.sqlite_session_store", "api.v1.prefork",
+        "api.v1.import_users", "models.user_session", "sqlite3")
+
+
+def test_import_time(tmp_path):
+    """ importing api.v1.app with many stored users loads none of them
+    and stays within BUDGET
+    """
+    with open(tmp_path / ".db_User.json", "w") as f:
+        json.dump({str(i): {"id": str(i), "email": "u{}@hbtn.io".format(i),
+                            "created_at": "2026-01-01T00:00:00",
+                            "updated_at": "2026-01-01T00:00:00"}
+                   for i in range(USERS)}, f)
+    env = dict(os.environ, PYTHONPATH=PROJECT, AUTH_TYPE="session_db_auth")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c",
+         "import sys, api.v1.app\n"
+         "from models.base import DATA\n"
+         "print(len(DATA.get('User', {})))\n"
+         "print(' '.join(sys.modules))"],
+        cwd=str(tmp_path), env=env, capture_output=True, text=True,
+        check=True)
+    loaded, modules = result.stdout.splitlines()
+    assert loaded == "0"
+    assert [name for name in LAZY if name in modules.split()] == []
+    own = 0
+    for line in result.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[0].startswith("import time:") and \
+                fields[2].strip().split(".")[0] in ("api", "models"):
+            own += int(fields[0].split(":")[1])
+    assert own / 1e6 < BUDGET
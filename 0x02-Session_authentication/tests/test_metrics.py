@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+""" Tests of /metrics and the Server-Timing header
+"""
+from tests.conftest import add_user, login
+
+
+def test_metrics_hidden_by_default(app):
+    """ without METRICS_ALLOW, nobody reads the metrics
+    """
+    assert app.test_client().get("/api/v1/metrics").status_code == 404
+
+
+def test_metrics_allowed(make_app):
+    """ the addresses of METRICS_ALLOW read the histograms of the routes
+    served, the others get 404
+    """
+    app = make_app(METRICS_ALLOW="10.0.50.1, 10.0.50.2")
+    add_user("bob@hbtn.io")
+    client = app.test_client()
+    assert login(client, "bob@hbtn.io").status_code == 200
+    assert client.get("/api/v1/users").status_code == 200
+    assert client.get("/api/v1/metrics").status_code == 404
+    response = client.get("/api/v1/metrics",
+                          environ_base={"REMOTE_ADDR": "10.0.50.2"})
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    text = response.get_data(as_text=True)
+    assert "# TYPE http_request_duration_seconds histogram" in text
+    assert 'http_request_duration_seconds_count{method="GET",' \
+        'route="/api/v1/users",status="200"} 1' in text
+    assert 'route="/api/v1/users",phase="storage"' in text
+
+
+def test_metrics_disabled(make_app):
+    """ METRICS=0 removes the metrics whoever asks
+    """
+    app = make_app(METRICS="0", METRICS_ALLOW="127.0.0.1")
+    assert "metrics" not in app.extensions
+    assert app.test_client().get("/api/v1/metrics").status_code == 404
+
+
+def test_server_timing(make_app):
+    """ the Server-Timing header is only added with SERVER_TIMING=1
+    """
+    client = make_app().test_client()
+    assert "Server-Timing" not in client.get("/api/v1/status").headers
+    client = make_app(SERVER_TIMING="1").test_client()
+    timing = client.get("/api/v1/status").headers["Server-Timing"]
+    assert "total;dur=" in timing
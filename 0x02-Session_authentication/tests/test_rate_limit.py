@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+""" Tests of the login rate limit (defaults: 20 failures per 60s per IP,
+5 per 60s per IP and email). The limiter lives as long as the process,
+so each test uses its own client addresses
+"""
+import threading
+from tests.conftest import add_user, login
+
+
+def attempt(app, ip: str, email: str = "bob@hbtn.io",
+            password: str = "pwd"):
+    """ Logs in from a client address
+    Return:
+        response of the login route
+    """
+    return login(app.test_client(), email, password,
+                 environ_base={"REMOTE_ADDR": ip})
+
+
+def test_failures_get_429(app):
+    """ beyond 5 failures on an account from one address, even the right
+    password gets 429 with Retry-After
+    """
+    add_user("bob@hbtn.io")
+    for _ in range(5):
+        assert attempt(app, "10.0.43.1", password="wrong").status_code == 401
+    response = attempt(app, "10.0.43.1")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_no_lockout_from_elsewhere(app):
+    """ failures from one address do not lock the account for others
+    """
+    add_user("bob@hbtn.io")
+    for _ in range(6):
+        attempt(app, "10.0.43.2", password="wrong")
+    assert attempt(app, "10.0.43.3").status_code == 200
+
+
+def test_successes_are_free(app):
+    """ successful logins never consume the limits
+    """
+    add_user("bob@hbtn.io")
+    for _ in range(25):
+        assert attempt(app, "10.0.43.4").status_code == 200
+
+
+def test_unknown_emails_count_per_address(app):
+    """ failures on any email add up per address
+    """
+    add_user("bob@hbtn.io")
+    for i in range(20):
+        assert attempt(app, "10.0.43.5", "nobody{}@hbtn.io".format(i)) \
+            .status_code == 404
+    assert attempt(app, "10.0.43.5").status_code == 429
+
+
+def test_clients_behind_proxy(make_app):
+    """ behind a trusted proxy, each client has its own limit, from the
+    last X-Forwarded-For address that is not a trusted proxy
+    """
+    app = make_app(ADMISSION_TRUSTED_PROXIES="10.0.43.6, 10.0.43.7")
+    add_user("bob@hbtn.io")
+
+    def proxied(client: str, password: str = "pwd"):
+        """ Logs in through the two proxies
+        """
+        return login(app.test_client(), "bob@hbtn.io", password,
+                     environ_base={"REMOTE_ADDR": "10.0.43.6"},
+                     headers={"X-Forwarded-For":
+                              "1.2.3.4, {}, 10.0.43.7".format(client)})
+
+    for _ in range(5):
+        assert proxied("192.0.2.1", "wrong").status_code == 401
+    assert proxied("192.0.2.1").status_code == 429
+    assert proxied("192.0.2.2").status_code == 200
+    for _ in range(5):
+        attempt(app, "10.0.43.8", password="wrong")
+    response = login(app.test_client(), "bob@hbtn.io",
+                     environ_base={"REMOTE_ADDR": "10.0.43.8"},
+                     headers={"X-Forwarded-For": "192.0.2.3"})
+    assert response.status_code == 429
+
+
+def test_concurrent_burst(app):
+    """ concurrent guesses cannot exceed the limit: each reserves its
+    attempt before the password is checked
+    """
+    add_user("bob@hbtn.io")
+    barrier = threading.Barrier(10)
+    statuses = []
+
+    def guess():
+        """ Tries a wrong password with the other threads
+        """
+        barrier.wait()
+        statuses.append(attempt(app, "10.0.43.9", password="wrong")
+                        .status_code)
+
+    threads = [threading.Thread(target=guess) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(statuses) == [401] * 5 + [429] * 5
+    assert attempt(app, "10.0.43.9").status_code == 429
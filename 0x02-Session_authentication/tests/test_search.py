@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+""" Tests of GET /api/v1/users/search
+"""
+import threading
+from models.text_index import TextIndex
+
+
+def emails(response) -> list:
+    """ Emails of a list of users, sorted
+    """
+    return sorted(user["email"] for user in response.get_json())
+
+
+def test_email_prefix(client):
+    """ q matches the start of the email
+    """
+    response = client.get("/api/v1/users/search?q=bob")
+    assert response.status_code == 200
+    assert emails(response) == ["bob@hbtn.io", "bobby@hbtn.io"]
+
+
+def test_name_substring(client):
+    """ q matches anywhere in first_name or last_name, ignoring case
+    """
+    assert emails(client.get("/api/v1/users/search?q=COOP")) == \
+        ["alice@hbtn.io"]
+    assert emails(client.get("/api/v1/users/search?q=mit")) == \
+        ["bobby@hbtn.io"]
+
+
+def test_limit(client):
+    """ limit caps the number of users returned
+    """
+    assert len(client.get("/api/v1/users/search?q=bob&limit=1")
+               .get_json()) == 1
+
+
+def test_saved_users_are_searchable(client):
+    """ the index follows the saves
+    """
+    response = client.post("/api/v1/users", json={
+        "email": "carol@hbtn.io", "password": "pwd", "last_name": "King"})
+    assert response.status_code == 201
+    assert emails(client.get("/api/v1/users/search?q=king")) == \
+        ["carol@hbtn.io"]
+
+
+def test_bad_requests(client):
+    """ 400 without q or with a wrong limit, 401 without a session
+    """
+    assert client.get("/api/v1/users/search").status_code == 400
+    assert client.get("/api/v1/users/search?q=b&limit=0").status_code == 400
+    assert client.get("/api/v1/users/search?q=b&limit=x").status_code == 400
+    client.delete_cookie("_my_session_id")
+    assert client.get("/api/v1/users/search?q=b").status_code == 401
+
+
+def test_search_while_saving():
+    """ lookups run safely while other threads update the index
+    """
+    class Obj:
+        """ Indexed object
+        """
+        def __init__(self, id, name):
+            self.id, self.email, self.first_name = id, name, name
+
+    text_index = TextIndex(prefix=("email",), contains=("first_name",))
+    stop, errors = threading.Event(), []
+
+    def write():
+        """ Adds and discards entries until stopped
+        """
+        i = 0
+        while not stop.is_set():
+            text_index.add(Obj(str(i % 50), "robert{}".format(i)))
+            text_index.discard(str((i + 25) % 50))
+            i += 1
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        for _ in range(3000):
+            try:
+                text_index.contains("ober", 20)
+                text_index.starts_with("email", "rob", 20)
+            except Exception as e:
+                errors.append(e)
+    finally:
+        stop.set()
+        writer.join()
+    assert errors == []
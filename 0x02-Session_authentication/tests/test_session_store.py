@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+""" Tests of the session stores: LRU cap, TTL expiry and per-user index
+of the in-memory SessionStore, and the SQL of SQLiteSessionStore
+"""
+import time
+from api.v1.auth.session_store import SessionStore
+from api.v1.auth.sqlite_session_store import SQLiteSessionStore
+
+
+def sizes(store: SessionStore) -> tuple:
+    """ (sessions, deadlines, heap entries, indexed sessions) of a store
+    """
+    return (len(store), len(store._deadlines), len(store._heap),
+            sum(len(ids) for ids in store._by_user.values()))
+
+
+def test_lru_cap():
+    """ beyond max_size, the least recently used sessions are evicted
+    from the data, the deadlines and the user index alike
+    """
+    store = SessionStore(max_size=100)
+    for i in range(1000):
+        store.set("s{}".format(i), "u{}".format(i % 10), ttl=60)
+        if i == 950:
+            store.get("s900")
+    assert len(store) == 100
+    assert "s900" in store and "s899" not in store and "s999" in store
+    sessions, deadlines, heap, indexed = sizes(store)
+    assert deadlines == indexed == 100
+    assert heap <= 2 * deadlines + 64
+    assert len(store._by_user) == 10
+
+
+def test_ttl_expiry():
+    """ sessions past their TTL are dropped, and nothing keeps them
+    """
+    store = SessionStore(max_size=0)
+    for i in range(500):
+        store.set("s{}".format(i), {"user_id": "u{}".format(i % 7)},
+                  ttl=10 if i % 2 else 0)
+    assert len(store) == 500
+    assert store.expire(time.monotonic() + 11) == 250
+    assert sizes(store) == (250, 0, 0, 250)
+    assert all(int(session_id[1:]) % 2 == 0 for session_id in store._data)
+
+
+def test_soak():
+    """ re-armed, deleted and expired sessions keep the heap, the data
+    and the index bounded
+    """
+    store = SessionStore(max_size=50)
+    for i in range(20000):
+        session_id = "s{}".format(i % 200)
+        store.set(session_id, "u{}".format(i % 13), ttl=1 + i % 5)
+        if i % 3 == 0:
+            store.pop("s{}".format((i + 7) % 200))
+    sessions, deadlines, heap, indexed = sizes(store)
+    assert sessions <= 50 and deadlines == sessions == indexed
+    assert heap <= 2 * deadlines + 64
+    store.expire(time.monotonic() + 6)
+    assert sizes(store)[:2] == (0, 0) and store._by_user == {}
+
+
+def test_user_index():
+    """ the sessions of a user are found and destroyed without a scan
+    """
+    store = SessionStore()
+    store["a"] = "bob"
+    store.set("b", {"user_id": "bob"}, ttl=60)
+    store["c"] = "alice"
+    assert sorted(store.session_ids_of("bob")) == ["a", "b"]
+    store["a"] = "alice"
+    assert store.session_ids_of("bob") == ["b"]
+    assert store.pop_user("alice") == 2
+    assert "c" not in store and store.session_ids_of("alice") == []
+    del store["b"]
+    assert store._by_user == {} and len(store) == 0
+
+
+def test_sqlite_store(tmp_path):
+    """ the shared store keeps deadlines on updates and pops sessions
+    with the SQL of old SQLite versions
+    """
+    store = SQLiteSessionStore(path=str(tmp_path / "sessions"), shards=2)
+    session_id = store.new_session_id()
+    store.set(session_id, {"user_id": "bob"}, ttl=1)
+    store[session_id] = {"user_id": "alice"}
+    assert store.session_ids_of("alice") == [session_id]
+    assert store.expire(time.time() + 2) == 1
+    store[session_id] = "bob"
+    assert store.pop(session_id) == "bob"
+    assert store.pop(session_id, "missing") == "missing"
+    assert len(store) == 0
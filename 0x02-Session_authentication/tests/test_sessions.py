@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+""" Tests of session revocation: logout, logout everywhere and removal
+of a user, with session_auth and signed_session_auth
+"""
+import time
+from api.v1.auth.session_auth import SessionAuth
+from api.v1.auth.signed_session_auth import SignedSessionAuth
+from tests.conftest import SESSION_NAME, add_user, login
+
+
+def me(client) -> int:
+    """ Status of GET /api/v1/users/me
+    """
+    return client.get("/api/v1/users/me").status_code
+
+
+def test_logout(client):
+    """ the session of a client is destroyed on logout
+    """
+    assert me(client) == 200
+    assert client.delete("/api/v1/auth_session/logout").status_code == 200
+    assert me(client) == 403
+
+
+def test_logout_everywhere(app, client):
+    """ DELETE /users/<id>/sessions destroys every session of the user
+    """
+    other = app.test_client()
+    login(other, "bob@hbtn.io")
+    bob = client.get("/api/v1/users/me").get_json()
+    response = client.delete("/api/v1/users/{}/sessions".format(bob["id"]))
+    assert response.status_code == 200
+    assert me(client) == 403
+    assert me(other) == 403
+
+
+def test_user_removal_destroys_sessions(app, client):
+    """ removing a user destroys its sessions
+    """
+    carol = add_user("carol@hbtn.io")
+    login(app.test_client(), "carol@hbtn.io")
+    assert SessionAuth.user_id_by_session_id.session_ids_of(carol.id)
+    client.delete("/api/v1/users/{}".format(carol.id))
+    assert SessionAuth.user_id_by_session_id.session_ids_of(carol.id) == []
+
+
+def test_signed_logout(make_app):
+    """ a signed token is revoked on logout, and all the tokens of a
+    user when their sessions are destroyed
+    """
+    app = make_app(AUTH_TYPE="signed_session_auth", SESSION_SECRET="secret",
+                   SESSION_DURATION="60")
+    add_user("bob@hbtn.io")
+    client, other = app.test_client(), app.test_client()
+    login(client, "bob@hbtn.io")
+    login(other, "bob@hbtn.io")
+    assert me(client) == 200
+    assert client.delete("/api/v1/auth_session/logout").status_code == 200
+    assert me(client) == 403
+    assert me(other) == 200
+    bob = other.get("/api/v1/users/me").get_json()
+    other.delete("/api/v1/users/{}/sessions".format(bob["id"]))
+    assert me(other) == 403
+
+
+def test_signed_revocation_shared_with_sqlite(tmp_path, monkeypatch):
+    """ with SESSION_BACKEND=sqlite, a token revoked by one process (here
+    one instance) is rejected by the others
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("SESSION_BACKEND", "sqlite")
+    monkeypatch.setenv("SESSION_SECRET", "secret")
+    monkeypatch.setenv("SESSION_NAME", SESSION_NAME)
+    first, second = SignedSessionAuth(), SignedSessionAuth()
+    token = first.create_session("42")
+
+    class Request:
+        """ Request holding the token in its cookie
+        """
+        cookies = {SESSION_NAME: token}
+
+    assert second.user_id_for_session_id(token) == "42"
+    assert first.destroy_session(Request())
+    assert second.user_id_for_session_id(token) is None
+
+
+def test_revocations_kept_beyond_size(make_app):
+    """ a revoked token stays revoked whatever the number of later
+    logouts: once SESSION_REVOCATION_SIZE revocations are kept, logins
+    fail closed instead of dropping the oldest
+    """
+    app = make_app(AUTH_TYPE="signed_session_auth", SESSION_SECRET="secret",
+                   SESSION_DURATION="60", SESSION_REVOCATION_SIZE="3")
+    add_user("bob@hbtn.io")
+    add_user("eve@hbtn.io")
+    victim = app.test_client()
+    login(victim, "bob@hbtn.io")
+    token = victim.get_cookie(SESSION_NAME).value
+    assert victim.delete("/api/v1/auth_session/logout").status_code == 200
+    carol = add_user("carol@hbtn.io")
+    other = app.test_client()
+    login(other, "carol@hbtn.io")
+    other.delete("/api/v1/users/{}/sessions".format(carol.id))
+    statuses = []
+    for _ in range(3):
+        attacker = app.test_client()
+        statuses.append(login(attacker, "eve@hbtn.io").status_code)
+        attacker.delete("/api/v1/auth_session/logout")
+    assert statuses == [200, 503, 503]
+    victim.set_cookie(SESSION_NAME, token)
+    assert me(victim) == 403
+    assert me(other) == 403
+
+
+def test_sqlite_revocations_kept_beyond_size(tmp_path, monkeypatch):
+    """ the shared revocation list never drops unexpired entries either
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("SESSION_BACKEND", "sqlite")
+    monkeypatch.setenv("SESSION_REVOCATION_SIZE", "2")
+    auth = SignedSessionAuth()
+    auth._revoked.expire_every = 0
+    tokens = [auth.create_session(str(i)) for i in range(2)]
+    for token in tokens:
+        auth._revoked.add(token.rsplit('.', 1)[1], 1, time.time() + 60)
+    assert auth.create_session("2") is None
+    auth._revoked.add("extra", 1, time.time() + 60)
+    assert all(auth.user_id_for_session_id(token) is None
+               for token in tokens)
+    auth._revoked.add("expired", 1, time.time() - 1)
+    auth._revoked.expire()
+    assert len(auth._revoked) == 3
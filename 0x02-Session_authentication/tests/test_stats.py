@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+""" Tests of GET /api/v1/stats
+"""
+import threading
+from models.aggregates import Aggregates
+from tests.conftest import add_user
+
+
+def test_counts_and_top_groups(client):
+    """ users per email domain: number of domains and the largest ones
+    """
+    add_user("carol@other.io")
+    stats = client.get("/api/v1/stats").get_json()
+    assert stats["users"] == 4
+    assert stats["counts"]["User"] == 4
+    assert stats["users_per_email_domain"] == {
+        "distinct": 2, "top": {"hbtn.io": 3, "other.io": 1}}
+
+
+def test_limit(client):
+    """ limit caps the groups listed, not the distinct count
+    """
+    add_user("carol@other.io")
+    stats = client.get("/api/v1/stats?limit=1").get_json()
+    assert stats["users_per_email_domain"] == {
+        "distinct": 2, "top": {"hbtn.io": 3}}
+
+
+def test_removals_are_counted(client):
+    """ the aggregates follow the removals
+    """
+    carol = add_user("carol@other.io")
+    assert client.delete("/api/v1/users/{}".format(carol.id)) \
+        .status_code == 200
+    stats = client.get("/api/v1/stats").get_json()
+    assert stats["users"] == 3
+    assert stats["users_per_email_domain"]["distinct"] == 1
+
+
+def test_wrong_limit(client):
+    """ 400 for a limit that is not a positive integer
+    """
+    assert client.get("/api/v1/stats?limit=0").status_code == 400
+    assert client.get("/api/v1/stats?limit=ten").status_code == 400
+
+
+def test_read_while_saving():
+    """ the counters are read safely while other threads update them
+    """
+    class User:
+        """ Counted object
+        """
+        def __init__(self, i):
+            self.id, self.created_at = str(i % 20000), None
+            self.email = "u{}@d{}.io".format(i, i)
+
+    aggregates = Aggregates()
+    stop, errors = threading.Event(), []
+
+    def write():
+        """ Saves and removes objects until stopped
+        """
+        i = 0
+        while not stop.is_set():
+            aggregates.hook("save", User(i))
+            aggregates.hook("remove", User(i + 10000))
+            i += 1
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        for _ in range(300):
+            try:
+                aggregates.to_json()
+            except RuntimeError as e:
+                errors.append(e)
+    finally:
+        stop.set()
+        writer.join()
+    assert errors == []
@@ -2,14 +2,56 @@
 """A simple Flask app with user authentication features.
 """
 import logging
+import math
+import os
 from flask import Flask, abort, jsonify, redirect, request
+from admission import (AdmissionControl, RouteLimit, client_address,
+                       trusted_proxies)
 from auth import Auth
+from db import DB
+from json_provider import install as install_json_provider
+from metrics import install as install_metrics, instrument
+from rate_limit import LoginRateLimiter
 
 logging.disable(logging.WARNING)
 
 
 AUTH = Auth()
+LIMITER = LoginRateLimiter()
+TRUSTED_PROXIES = trusted_proxies(os.getenv("ADMISSION_TRUSTED_PROXIES"))
 app = Flask(__name__)
+install_json_provider(app)
+AUTH_ROUTES = ("/users", "/sessions", "/reset_password")
+EXEMPT_ROUTES = ("", "/metrics")
+
+if os.getenv("METRICS", "1") != "0":
+    install_metrics(app)
+    if hasattr(app, "json"):  # jsonify, pluggable since Flask 2.2
+        instrument(app.json, ("response",), "serialization")
+    instrument(Auth, ("register_user", "valid_login", "create_session",
+                      "get_user_from_session_id", "destroy_session",
+                      "get_reset_password_token", "update_password"), "auth")
+    instrument(DB, ("add_user", "find_user_by", "update_user"), "storage")
+
+
+def route_class(path: str) -> str:
+    """Admission control class of a path.
+    Return:
+        - None for "/" and "/metrics", which are always admitted, "auth"
+          for the routes hashing passwords, else "default".
+    """
+    if path.rstrip("/") in EXEMPT_ROUTES:
+        return None
+    if path.rstrip("/") in AUTH_ROUTES:
+        return "auth"
+    return "default"
+
+
+if os.getenv("ADMISSION_CONTROL", "1") != "0":
+    app.wsgi_app = AdmissionControl(app.wsgi_app, {
+        "auth": RouteLimit(1.0),
+        "default": RouteLimit(0.5)
+    }, route_class, TRUSTED_PROXIES)
 
 
 @app.route("/", methods=["GET"], strict_slashes=False)
@@ -21,6 +63,22 @@ def index() -> str:
     return jsonify({"message": "Bienvenue"})
 
 
+@app.route("/metrics", methods=["GET"], strict_slashes=False)
+def metrics() -> str:
+    """GET /metrics
+    Return:
+        - Request latency histograms and time spent in each phase (auth,
+          storage, serialization), in the Prometheus text format.
+        - 404 if the metrics are disabled (METRICS=0) or the client
+          address is not in METRICS_ALLOW.
+    """
+    metrics = app.extensions.get("metrics")
+    if metrics is None or not metrics.allows(request.remote_addr):
+        abort(404)
+    return app.response_class(metrics.render(),
+                              mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/users", methods=["POST"], strict_slashes=False)
 def users() -> str:
     """POST /users
@@ -43,8 +101,14 @@ def login() -> str:
         - JSON payload of the form containing login info.
     """
     email, password = request.form.get("email"), request.form.get("password")
+    ip = client_address(request.environ, TRUSTED_PROXIES)
+    wait = LIMITER.check(ip, email)
+    if wait:
+        return jsonify({"message": "too many requests"}), 429, \
+            {"Retry-After": str(math.ceil(wait))}
     if not AUTH.valid_login(email, password):
         abort(401)
+    LIMITER.succeeded(ip, email)
     session_id = AUTH.create_session(email)
     response = jsonify({"email": email, "message": "logged in"})
     response.set_cookie("session_id", session_id)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""JSON provider encoding the responses with the fastest encoder installed.
+Keys are sorted whatever the encoder, as Flask's jsonify does by default.
+Deliberate copy of 0x02-Session_authentication/models/encoder.py and of
+the provider of 0x02-Session_authentication/api/v1/json_provider.py, the
+source of truth: each project directory runs on its own and they share
+no package, so change those files and copy them here.
+"""
+import json
+from os import getenv
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+_STDLIB = json.JSONEncoder(separators=(',', ':'), sort_keys=True)  # Reused
+
+
+def _stdlib_dumps(obj) -> bytes:
+    """ Encode obj with the standard library
+    """
+    return _STDLIB.encode(obj).encode('utf-8')
+
+
+def _ujson_dumps(obj) -> bytes:
+    """ Encode obj with ujson
+    """
+    return ujson.dumps(obj, sort_keys=True).encode('utf-8')
+
+
+def _orjson_dumps(obj) -> bytes:
+    """ Encode obj with orjson
+    """
+    return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+
+
+_ENCODERS = {"json": _stdlib_dumps}
+if ujson is not None:
+    _ENCODERS["ujson"] = _ujson_dumps
+if orjson is not None:
+    _ENCODERS["orjson"] = _orjson_dumps
+
+# JSON_ENCODER forces one of the installed encoders, else the fastest wins
+ENCODER = getenv("JSON_ENCODER", "")
+if ENCODER not in _ENCODERS:
+    ENCODER = "orjson" if orjson else "ujson" if ujson else "json"
+dumps = _ENCODERS[ENCODER]  # dumps(obj) -> bytes, compact, sorted keys
+
+
+try:
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:  # Flask < 2.2 encodes through app.json_encoder
+    from flask.json import JSONEncoder
+    DefaultJSONProvider = None
+
+
+if DefaultJSONProvider is not None:
+    class FastJSONProvider(DefaultJSONProvider):
+        """
+        Flask JSON provider using the fastest installed encoder,
+        falling back to the standard one for the objects or options it
+        doesn't handle; keys are sorted unless sort_keys is turned off,
+        which also falls back
+        """
+
+        def dumps(self, obj, **kwargs) -> str:
+            """
+            Serialize obj to a JSON string
+            """
+            if not kwargs and self.sort_keys:
+                try:
+                    return dumps(obj).decode('utf-8')
+                except TypeError:
+                    pass
+            return super().dumps(obj, **kwargs)
+
+        def response(self, *args, **kwargs):
+            """
+            Serialize the arguments of jsonify into a JSON response,
+            encoded straight to bytes
+            """
+            if self._app.debug or not self.sort_keys:
+                return super().response(*args, **kwargs)
+            obj = self._prepare_response_obj(args, kwargs)
+            try:
+                body = dumps(obj)
+            except TypeError:
+                return super().response(*args, **kwargs)
+            return self._app.response_class(body, mimetype=self.mimetype)
+else:
+    class FastJSONEncoder(JSONEncoder):
+        """
+        Flask 1.x JSON encoder using the fastest installed encoder for
+        compact output with sorted keys (the defaults of jsonify),
+        falling back to the standard one for the objects or options it
+        doesn't handle
+        """
+
+        def encode(self, o) -> str:
+            """
+            Serialize o to a JSON string
+            """
+            if self.indent is None and self.sort_keys:
+                try:
+                    return dumps(o).decode('utf-8')
+                except TypeError:
+                    pass
+            return super().encode(o)
+
+
+def install(app) -> str:
+    """
+    Makes jsonify use the fastest installed encoder, through the JSON
+    provider of Flask >= 2.2 or the JSON encoder class of Flask 1.x
+    Return:
+        name of the encoder used by jsonify
+    """
+    if DefaultJSONProvider is None:
+        app.json_encoder = FastJSONEncoder
+    else:
+        app.json = FastJSONProvider(app)
+    return ENCODER
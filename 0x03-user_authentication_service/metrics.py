@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Per-request timing: latency histograms per route, time spent in each
+phase (auth, storage, serialization), Server-Timing header and
+Prometheus text exposition.
+Timings tell how long a password check or a lookup took, so both the
+header and the exposition are off unless configured.
+Deliberate copy of 0x02-Session_authentication/api/v1/metrics.py, the
+source of truth: each project directory runs on its own and they share
+no package, so change that file and copy it here.
+"""
+import os
+import threading
+from bisect import bisect_left
+from functools import wraps
+from time import perf_counter
+from flask import request
+
+PHASES = ("auth", "storage", "serialization")
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+           2.5, 5.0, 10.0)  # Upper bounds in seconds, +Inf is implied
+_local = threading.local()  # Timing of the request handled by the thread
+
+
+class _Timing:
+    """
+    Phases of one request. Phases may nest (the auth of a request looks
+    its user up in storage): each one is charged its own time only, the
+    time of the phases it calls being charged to them
+    """
+    __slots__ = ('start', 'phases', 'stack')
+
+    def __init__(self):
+        """
+        Start timing a request
+        """
+        self.start = perf_counter()
+        self.phases = {}
+        self.stack = []
+
+    def enter(self, phase: str):
+        """
+        Start a phase
+        """
+        self.stack.append([phase, perf_counter(), 0.0])
+
+    def exit(self):
+        """
+        End the innermost phase
+        """
+        phase, start, inner = self.stack.pop()
+        elapsed = perf_counter() - start
+        self.phases[phase] = self.phases.get(phase, 0.0) + elapsed - inner
+        if self.stack:
+            self.stack[-1][2] += elapsed
+
+
+def timed(phase: str):
+    """
+    Decorator charging the time of a function to a phase of the current
+    request; outside requests the function is called as is
+    """
+    def decorator(func):
+        """
+        Wrap func
+        """
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            """
+            Call func within the phase
+            """
+            timing = getattr(_local, 'timing', None)
+            if timing is None:
+                return func(*args, **kwargs)
+            timing.enter(phase)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timing.exit()
+        wrapper.__phase__ = phase
+        return wrapper
+    return decorator
+
+
+def instrument(owner, names, phase: str):
+    """
+    Charges the time of methods of a class or an instance to a phase,
+    by replacing them with timed wrappers (once, whatever the calls)
+    Args:
+        owner: class (methods, classmethods or staticmethods) or instance
+        names: names of the methods
+        phase (str): phase charged
+    """
+    wrap = timed(phase)
+    for name in names:
+        attr = vars(owner)[name] if isinstance(owner, type) \
+            else getattr(owner, name)
+        func = getattr(attr, '__func__', attr)
+        if getattr(func, '__phase__', None) is not None:
+            continue
+        if isinstance(attr, (classmethod, staticmethod)):
+            attr = type(attr)(wrap(func))
+        else:
+            attr = wrap(attr)
+        setattr(owner, name, attr)
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    """
+    Formats Prometheus labels, escaping their values
+    """
+    return ','.join('{}="{}"'.format(name, str(value).replace(
+        '\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values))
+
+
+class Metrics:
+    """
+    Request metrics of an application: a latency histogram per method,
+    route and status, and the seconds spent in each phase per method and
+    route. Latency is measured from the first before_request function to
+    the after_request functions, so the body of a streamed response is
+    not included.
+    """
+
+    def __init__(self, buckets: tuple = BUCKETS, phases: tuple = PHASES,
+                 server_timing: bool = False, allow: frozenset = frozenset()):
+        """
+        Initialize empty metrics
+        Args:
+            buckets (tuple): upper bounds of the latency histograms
+            phases (tuple): phases reported
+            server_timing (bool): add a Server-Timing header to responses
+            allow (frozenset): client addresses allowed to read the
+            metrics, none by default
+        """
+        self.buckets = buckets
+        self.phases = phases
+        self.server_timing = server_timing
+        self.allow = allow
+        self._durations = {}  # (method, route, status) -> [counts, sum]
+        self._phases = {}  # (method, route) -> {phase: seconds}
+        self._lock = threading.Lock()
+        # Built once: formatting is most of the cost of a request's timing
+        self._server_timing = ', '.join(
+            '{};dur=%.3f'.format(phase) for phase in phases + ('total',))
+
+    def start(self):
+        """
+        before_request function starting the timing of the request
+        """
+        _local.timing = _Timing()
+
+    def finish(self, response):
+        """
+        after_request function recording the request and, if enabled,
+        adding its Server-Timing header (milliseconds per phase and in
+        total)
+        """
+        timing = getattr(_local, 'timing', None)
+        _local.timing = None
+        if timing is None:
+            return response
+        duration = perf_counter() - timing.start
+        req = request._get_current_object()
+        rule = req.url_rule
+        route = rule.rule if rule is not None else "unmatched"
+        phases = timing.phases
+        self.observe(req.method, route, response.status_code, duration,
+                     phases)
+        if not self.server_timing:
+            return response
+        response.headers['Server-Timing'] = self._server_timing % (tuple(
+            phases.get(phase, 0.0) * 1000 for phase in self.phases) +
+            (duration * 1000,))
+        return response
+
+    def observe(self, method: str, route: str, status: int,
+                duration: float, phases: dict):
+        """
+        Records a request of duration seconds and its phases
+        """
+        bucket = bisect_left(self.buckets, duration)
+        with self._lock:
+            series = self._durations.get((method, route, status))
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0]
+                self._durations[(method, route, status)] = series
+            series[0][bucket] += 1
+            series[1] += duration
+            if phases:
+                totals = self._phases.setdefault((method, route), {})
+                for phase, seconds in phases.items():
+                    totals[phase] = totals.get(phase, 0.0) + seconds
+
+    def allows(self, address: str) -> bool:
+        """
+        True if a client address may read the metrics
+        """
+        return address in self.allow
+
+    def render(self) -> str:
+        """
+        Returns the metrics in the Prometheus text exposition format
+        """
+        with self._lock:
+            durations = [(key, list(counts), total)
+                         for key, (counts, total) in self._durations.items()]
+            phases = [(key + (phase,), seconds)
+                      for key, totals in self._phases.items()
+                      for phase, seconds in totals.items()]
+        bounds = ['{:g}'.format(bound) for bound in self.buckets] + ['+Inf']
+        lines = [
+            "# HELP http_request_duration_seconds Time to build the "
+            "response of a request",
+            "# TYPE http_request_duration_seconds histogram"
+        ]
+        names = ('method', 'route', 'status')
+        for key, counts, total in sorted(durations):
+            labels = _labels(names, key)
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                lines.append('http_request_duration_seconds_bucket'
+                             '{{{},le="{}"}} {}'.format(labels, bound,
+                                                        cumulative))
+            lines.append('http_request_duration_seconds_sum{{{}}} {!r}'
+                         .format(labels, total))
+            lines.append('http_request_duration_seconds_count{{{}}} {}'
+                         .format(labels, cumulative))
+        lines.extend([
+            "# HELP http_request_phase_seconds_total Time spent in each "
+            "phase of the requests",
+            "# TYPE http_request_phase_seconds_total counter"
+        ])
+        names = ('method', 'route', 'phase')
+        for key, seconds in sorted(phases):
+            lines.append('http_request_phase_seconds_total{{{}}} {!r}'
+                         .format(_labels(names, key), seconds))
+        return '\n'.join(lines) + '\n'
+
+
+def install(app) -> Metrics:
+    """
+    Times every request of app, whose metrics are kept in
+    app.extensions['metrics']. Install it before the other
+    before_request functions so that their time is included.
+    SERVER_TIMING=1 adds the Server-Timing header to every response and
+    METRICS_ALLOW lists the comma-separated client addresses allowed to
+    read the metrics (none by default)
+    """
+    metrics = Metrics(
+        server_timing=os.getenv('SERVER_TIMING', '0') == '1',
+        allow=frozenset(address.strip() for address in
+                        os.getenv('METRICS_ALLOW', '').split(',')
+                        if address.strip()))
+    app.before_request(metrics.start)
+    app.after_request(metrics.finish)
+    app.extensions['metrics'] = metrics
+    return metrics
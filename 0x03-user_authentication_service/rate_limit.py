@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Token-bucket rate limiting of login attempts.
+Deliberate copy of 0x02-Session_authentication/api/v1/auth/rate_limit.py,
+the source of truth: each project directory runs on its own and they
+share no package, so change that file and copy it here.
+"""
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+def _env_limit(name: str, default: str) -> tuple:
+    """
+    Returns (capacity, period) from an environment variable written
+    "<attempts>/<seconds>", e.g. "10/60"; "0" disables the limit
+    """
+    value = os.getenv(name, default)
+    try:
+        capacity, _, period = value.partition('/')
+        return int(capacity), float(period or 1)
+    except ValueError:
+        capacity, _, period = default.partition('/')
+        return int(capacity), float(period or 1)
+
+
+class TokenBucketLimiter:
+    """
+    Token buckets keyed by an arbitrary string.
+    A bucket holds up to capacity tokens and regains capacity tokens per
+    period; each attempt takes one. Keys are spread over shards, each
+    with its own lock and map of key -> (tokens, last update) kept in
+    update order, so concurrent requests rarely contend. A bucket left
+    alone long enough to be full again is equivalent to no bucket: such
+    buckets are evicted from the front of their shard as others are
+    updated, and beyond max_keys the least recently updated are dropped.
+    """
+
+    def __init__(self, capacity: int, period: float, shards: int = 16,
+                 max_keys: int = 100000):
+        """
+        Initialize the limiter
+        Args:
+            capacity (int): attempts allowed in a burst, 0 or less (or a
+            period of 0 or less) to allow every attempt
+            period (float): seconds to regain capacity attempts
+            shards (int): number of independently locked shards
+            max_keys (int): maximum number of buckets kept over all shards
+        """
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period if capacity > 0 and period > 0 \
+            else 0.0
+        self._shards = [(OrderedDict(), Lock())
+                        for _ in range(max(shards, 1))]
+        self._shard_size = max(max_keys // len(self._shards), 1)
+
+    def consume(self, key: str, now: float = None) -> float:
+        """
+        Takes one token from the bucket of key
+        Return:
+            0.0 if the attempt is allowed, else the seconds to wait for
+            the next token
+        """
+        if self.rate <= 0 or key is None:
+            return 0.0
+        if now is None:
+            now = time.monotonic()
+        buckets, lock = self._shards[hash(key) % len(self._shards)]
+        with lock:
+            tokens, last = buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / self.rate
+            buckets[key] = (tokens, now)
+            buckets.move_to_end(key)
+            self._evict(buckets, now)
+        return wait
+
+    def refund(self, key: str):
+        """
+        Gives back the token taken by an allowed attempt
+        """
+        if self.rate <= 0 or key is None:
+            return
+        buckets, lock = self._shards[hash(key) % len(self._shards)]
+        with lock:
+            entry = buckets.get(key)
+            if entry is not None:
+                buckets[key] = (min(self.capacity, entry[0] + 1), entry[1])
+
+    def _evict(self, buckets: OrderedDict, now: float):
+        """
+        Drops the buckets of a shard that are full again, and the least
+        recently updated beyond the shard size
+        """
+        full_since = now - self.period
+        while buckets:
+            key = next(iter(buckets))
+            if len(buckets) <= self._shard_size and \
+                    buckets[key][1] > full_since:
+                break
+            del buckets[key]
+
+    def __len__(self) -> int:
+        """
+        Number of buckets kept
+        """
+        return sum(len(buckets) for buckets, _ in self._shards)
+
+
+class LoginRateLimiter:
+    """
+    Limits failed login attempts per client IP and per (client IP,
+    email), so that guessing from one address is refused before any
+    password is hashed. Every attempt reserves a token of both buckets
+    before the password is checked, so a concurrent burst cannot pass
+    the limit, and successful logins get theirs back. An account is only
+    locked for the addresses failing on it, so nobody can lock a user
+    out from elsewhere, provided the client IP is resolved behind
+    proxies (see admission.client_address).
+    Limits are read from LOGIN_LIMIT_IP (default "20/60") and
+    LOGIN_LIMIT_EMAIL (default "5/60", per IP and email), as
+    "<failures>/<seconds>".
+    """
+
+    def __init__(self):
+        """
+        Initialize the per-IP and per-(IP, email) limiters
+        """
+        self.by_ip = TokenBucketLimiter(*_env_limit('LOGIN_LIMIT_IP',
+                                                    '20/60'))
+        self.by_email = TokenBucketLimiter(*_env_limit('LOGIN_LIMIT_EMAIL',
+                                                       '5/60'))
+        self.rejected = 0
+
+    @staticmethod
+    def _account(ip: str, email: str) -> str:
+        """
+        Returns the (IP, email) bucket key, None without an email
+        """
+        if not email:
+            return None
+        return "{} {}".format(ip, email.strip().lower())
+
+    def check(self, ip: str, email: str) -> float:
+        """
+        Counts a login attempt as failed until succeeded is called
+        Args:
+            ip (str): client address
+            email (str): email attempted
+        Return:
+            0.0 if the attempt may proceed, else the seconds to wait
+        """
+        wait = self.by_ip.consume(ip)
+        if not wait:
+            wait = self.by_email.consume(self._account(ip, email))
+            if wait:
+                self.by_ip.refund(ip)
+        if wait:
+            self.rejected += 1
+        return wait
+
+    def succeeded(self, ip: str, email: str):
+        """
+        Refunds the attempt counted by check, once the login succeeded
+        Args:
+            ip (str): client address
+            email (str): email attempted
+        """
+        self.by_ip.refund(ip)
+        self.by_email.refund(self._account(ip, email))
+
+    def stats(self) -> dict:
+        """
+        Returns the limiter counters
+        """
+        return {
+            "rejected": self.rejected,
+            "ip_buckets": len(self.by_ip),
+            "ip_email_buckets": len(self.by_email)
+        }